@@ -16,11 +16,11 @@ for fname, sorter, curver in [
     ("fevery.gif", HilbertSortEveryLine(), cubic_curve),
 ]:
     with Animation(size=(600, 600), output=fname) as anim:
-        for i in range(FRAMES):
+        f = Fluidity(
+            CircularNoise(seed=SEED, isteps=FRAMES, istep=ISTEP),
+            npoints=NPOINTS, nlines=NLINES, sorter=sorter, curver=curver,
+        )
+        for i, frame in enumerate(f.frames(FRAMES)):
             if i > 0:
                 anim.new_frame()
-            f = Fluidity(
-                CircularNoise(seed=SEED, isteps=FRAMES, istep=ISTEP, istart=i), 
-                npoints=NPOINTS, nlines=NLINES, sorter=sorter, curver=curver,
-            )
-            f.draw_in_context(anim.context, point_color=(1, 0, 0, 1))
+            frame.draw_in_context(anim.context, point_color=(1, 0, 0, 1))
@@ -0,0 +1,245 @@
+"""
+Render grids of Fluidity drawings from the command line.
+
+    python fluidity.py --seed 100:200 --istep 0.001 --istart 0.07 \
+        --nlines 40 --draw curve_width=1.5 --draw "curve_color=[0,0,0,0.3]" \
+        -o "repro/{seed:03d}.png"
+
+Every combination of the values given is rendered, across a pool of worker
+processes.  Outputs are written atomically, and a hash of each output's inputs
+is kept next to it, so re-running the same command only renders what changed.
+"""
+
+import argparse
+import concurrent.futures
+import dataclasses
+import hashlib
+import itertools
+import json
+import os
+import sys
+
+from fluidity import (
+    CircularNoise,
+    Fluidity,
+    HilbertSortEveryLine,
+    HilbertSortFirstLine,
+    LinearNoise,
+    cubic_curve,
+    hobby_curve,
+)
+from geometry_cache import GeometryCache, make_temp_file
+
+
+NOISES = {"linear": LinearNoise, "circular": CircularNoise}
+SORTERS = {"none": None, "every": HilbertSortEveryLine, "first": HilbertSortFirstLine}
+CURVERS = {"hobby": hobby_curve, "cubic": cubic_curve}
+
+# Changing any of these files changes what the drawings look like.
+SOURCES = ["fluidity.py", "hobby.py", "cubic_spline.py", "numba_kernels.py", "drawing.py", "svgwriter.py", "density.py"]
+
+# The grid parameters that go to the noise.
+NOISE_PARAMS = ["seed", "istart", "istep", "isteps"]
+
+
+@dataclasses.dataclass
+class Job:
+    """One drawing to render: its parameters and where it goes."""
+    params: dict
+    draw: dict
+    output: str
+
+    def inputs_hash(self, sources_hash):
+        """A hash of everything that determines the output's contents."""
+        data = json.dumps([self.params, self.draw, sources_hash], sort_keys=True)
+        return hashlib.sha256(data.encode()).hexdigest()
+
+
+def sources_hash():
+    """A hash of the source files that drawings depend on."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256()
+    for name in SOURCES:
+        with open(os.path.join(here, name), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def hash_path(output):
+    """The file next to `output` that holds the hash of its inputs."""
+    dirname, basename = os.path.split(output)
+    return os.path.join(dirname, f".{basename}.inputs")
+
+
+def up_to_date(output, inputs_hash):
+    try:
+        with open(hash_path(output)) as f:
+            return os.path.exists(output) and f.read().strip() == inputs_hash
+    except FileNotFoundError:
+        return False
+
+
+def atomic_write_path(output):
+    """A temporary file in `output`'s directory, with the same extension."""
+    dirname, basename = os.path.split(output)
+    fd, temp = make_temp_file(dirname or ".", f".{basename}.", os.path.splitext(output)[1])
+    os.close(fd)
+    return temp
+
+
+def make_fluidity(params, cache=None):
+    noise_class = NOISES[params["noise"]]
+    # Each noise takes only some of the noise parameters.
+    fields = {field.name for field in dataclasses.fields(noise_class)}
+    noise_args = {
+        name: params[name] for name in NOISE_PARAMS if name in fields and params.get(name) is not None
+    }
+    sorter = SORTERS[params["sorter"]]
+    return Fluidity(
+        noise_class(**noise_args),
+        npoints=params["npoints"],
+        nlines=params["nlines"],
+        sorter=sorter() if sorter else None,
+        curver=CURVERS[params["curver"]],
+        cache=cache,
+    )
+
+
+def render(job, inputs_hash, cache_dir=None):
+    """Render `job` to its output, replacing the file only when it's done."""
+    params = job.params
+    cache = GeometryCache(cache_dir) if cache_dir else None
+    os.makedirs(os.path.dirname(job.output) or ".", exist_ok=True)
+    temp = atomic_write_path(job.output)
+    try:
+        make_fluidity(params, cache).draw(
+            format=params["format"], size=params["size"], output=temp, **job.draw
+        )
+        os.replace(temp, job.output)
+    except BaseException:
+        os.remove(temp)
+        raise
+    temp = atomic_write_path(hash_path(job.output))
+    with open(temp, "w") as f:
+        f.write(inputs_hash + "\n")
+    os.replace(temp, hash_path(job.output))
+    return job.output
+
+
+def parse_values(text, convert):
+    """Values for a grid axis from one argument: START:STOP[:STEP] for ints."""
+    if convert is int and ":" in text:
+        return list(range(*map(int, text.split(":"))))
+    return [convert(text)]
+
+
+def parse_size(text):
+    """WIDTHxHEIGHT, or just WIDTH for a square."""
+    width, _, height = text.partition("x")
+    return (int(width), int(height or width))
+
+
+def parse_draw(text):
+    """A KEY=VALUE draw option, with the value in JSON."""
+    key, eq, value = text.partition("=")
+    if not eq:
+        raise argparse.ArgumentTypeError(f"Expected KEY=VALUE, not {text!r}")
+    try:
+        value = json.loads(value)
+    except json.JSONDecodeError:
+        # Let plain strings go without JSON quotes.
+        pass
+    if isinstance(value, list):
+        value = tuple(value)
+    return key, value
+
+
+GRID_ARGS = {
+    # name: (convert, default)
+    "noise": (str, ["linear"]),
+    "seed": (int, [1]),
+    "istart": (float, [None]),
+    "istep": (float, [None]),
+    "isteps": (int, [None]),
+    "npoints": (int, [10]),
+    "nlines": (int, [100]),
+    "curver": (str, ["hobby"]),
+    "sorter": (str, ["every"]),
+    "size": (parse_size, [(600, 600)]),
+    "format": (str, ["png"]),
+}
+CHOICES = {"noise": NOISES, "curver": CURVERS, "sorter": SORTERS, "format": ["png", "svg"]}
+
+
+def make_jobs(args):
+    """The Jobs for every combination of the grid's values."""
+    axes = {}
+    for name, (convert, default) in GRID_ARGS.items():
+        texts = getattr(args, name)
+        axes[name] = [v for text in texts for v in parse_values(text, convert)] if texts else default
+    draw_axes = {}
+    for key, value in args.draw or []:
+        draw_axes.setdefault(key, []).append(value)
+
+    jobs = []
+    combos = itertools.product(
+        itertools.product(*axes.values()), itertools.product(*draw_axes.values())
+    )
+    for index, (values, draw_values) in enumerate(combos):
+        params = dict(zip(axes, values))
+        draw = dict(zip(draw_axes, draw_values))
+        output = args.output.format(index=index, **params, **draw)
+        jobs.append(Job(params, draw, output))
+    outputs = [job.output for job in jobs]
+    if len(set(outputs)) != len(outputs):
+        raise ValueError(f"Output template {args.output!r} makes the same file name more than once")
+    return jobs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="fluidity",
+        description="Render every combination of Fluidity parameters",
+        epilog="Integer values can be ranges, START:STOP[:STEP].",
+    )
+    for name, (_, default) in GRID_ARGS.items():
+        parser.add_argument(
+            f"--{name}", nargs="+", action="extend", choices=CHOICES.get(name),
+            help=f"Values to render (default: {default[0]})",
+        )
+    parser.add_argument(
+        "--draw", action="append", type=parse_draw, metavar="KEY=VALUE",
+        help="An argument for Fluidity.draw, value in JSON. Repeat a key to render each value.",
+    )
+    parser.add_argument(
+        "-o", "--output", default="out/{index:04d}.{format}",
+        help="File name template, with the parameters as fields (default: %(default)s)",
+    )
+    parser.add_argument("-j", "--workers", type=int, help="Processes to use (default: one per CPU)")
+    parser.add_argument("--cache", metavar="DIR", help="Reuse computed geometry from this cache directory")
+    parser.add_argument("-f", "--force", action="store_true", help="Render even up-to-date outputs")
+    args = parser.parse_args(argv)
+
+    try:
+        jobs = make_jobs(args)
+    except (KeyError, ValueError) as exc:
+        parser.error(str(exc))
+    source_hash = sources_hash()
+    todo = []
+    for job in jobs:
+        inputs_hash = job.inputs_hash(source_hash)
+        if not args.force and up_to_date(job.output, inputs_hash):
+            continue
+        todo.append((job, inputs_hash))
+    print(f"{len(jobs) - len(todo)} of {len(jobs)} up to date")
+
+    failures = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(render, job, inputs_hash, args.cache): job for job, inputs_hash in todo}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                print(f"Wrote {future.result()}")
+            except Exception as exc:
+                failures += 1
+                print(f"Failed {futures[future].output}: {exc!r}", file=sys.stderr)
+    return 1 if failures else 0
@@ -0,0 +1,253 @@
+"""
+Time the stages of the Fluidity pipeline and the renderers.
+
+    python benchmarks.py run -o results.json
+    python benchmarks.py compare before.json after.json
+
+`run` times noise generation, sorting, curve fitting, drawing to SVG and PNG,
+and animation encoding, over a grid of sizes, and writes the timings as JSON.
+`compare` matches up two such files and reports the ones that got slower.
+"""
+
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from drawing import Animation, cairo_context
+from fluidity import (
+    CircularNoise,
+    Fluidity,
+    HilbertSortEveryLine,
+    HilbertSortFirstLine,
+    LinearNoise,
+    cubic_curve,
+    hobby_curve,
+)
+
+
+NOISES = {
+    "linear": lambda: LinearNoise(seed=139, istep=0.005),
+    "circular": lambda: CircularNoise(seed=9, istep=0.01, isteps=100),
+}
+SORTERS = {
+    "none": lambda: None,
+    "every": HilbertSortEveryLine,
+    "first": HilbertSortFirstLine,
+}
+CURVERS = {
+    "hobby": hobby_curve,
+    "cubic": cubic_curve,
+}
+
+FULL_GRID = {
+    "npoints": [10, 50],
+    "nlines": [100, 1000],
+    "size": [600, 2000],
+    "frames": 20,
+}
+QUICK_GRID = {
+    "npoints": [10],
+    "nlines": [100],
+    "size": [600],
+    "frames": 5,
+}
+
+
+def timeit(func, repeat):
+    """Run `func` `repeat` times, returning the list of durations in seconds."""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def sort_lines(sorter, grid):
+    if sorter is None:
+        return grid.tolist()
+    return sorter.sort_lines(grid).tolist()
+
+
+def curve_lines(curver, lines):
+    batch = getattr(curver, "batch", None)
+    if batch is not None:
+        return batch(lines)
+    return [curver(line) for line in lines]
+
+
+def benchmarks(grid):
+    """Yield (name, params, func) for every benchmark in the grid."""
+    for npoints, nlines in itertools.product(grid["npoints"], grid["nlines"]):
+        shape = {"npoints": npoints, "nlines": nlines}
+        for noise_name, make_noise in NOISES.items():
+            noise = make_noise()
+            yield (
+                "noise",
+                {**shape, "noise": noise_name},
+                lambda noise=noise: noise.points(range(nlines), range(npoints)),
+            )
+
+        points = NOISES["linear"]().points(range(nlines), range(npoints))
+        for sorter_name, make_sorter in SORTERS.items():
+            yield (
+                "sort",
+                {**shape, "sorter": sorter_name},
+                lambda make_sorter=make_sorter: sort_lines(make_sorter(), points),
+            )
+
+        lines = HilbertSortEveryLine().sort_lines(points).tolist()
+        for curver_name, curver in CURVERS.items():
+            yield (
+                "curve",
+                {**shape, "curver": curver_name},
+                lambda curver=curver: curve_lines(curver, lines),
+            )
+
+        f = Fluidity(NOISES["linear"](), npoints=npoints, nlines=nlines, sorter=HilbertSortEveryLine())
+        for size, format in itertools.product(grid["size"], ["svg", "png", "svg-direct", "density"]):
+            yield (
+                "draw",
+                {**shape, "size": size, "format": format},
+                lambda size=size, format=format: draw(f, size, format),
+            )
+
+    encoders = ["pillow"]
+    if shutil.which("magick"):
+        encoders.append("magick")
+    for size, encoder in itertools.product(grid["size"], encoders):
+        yield (
+            "animation",
+            {"size": size, "frames": grid["frames"], "encoder": encoder},
+            lambda size=size, encoder=encoder: animate(size, grid["frames"], encoder),
+        )
+
+
+def draw(f, size, format):
+    with tempfile.TemporaryDirectory() as tempdir:
+        if format == "svg-direct":
+            f.draw(backend="svg", size=(size, size), output=f"{tempdir}/out.svg", curve_color=(0, 0, 0, 0.3), curve_width=1)
+            return
+        if format == "density":
+            f.draw_density(size=(size, size), output=f"{tempdir}/out.png", curve_color=(0, 0, 0, 0.3), curve_width=1)
+            return
+        with cairo_context(size, size, format=format, output=f"{tempdir}/out.{format}") as context:
+            f.draw_in_context(context, curve_color=(0, 0, 0, 0.3), curve_width=1)
+
+
+def animate(size, nframes, encoder):
+    f = Fluidity(NOISES["circular"](), npoints=7, nlines=40, curver=cubic_curve, sorter=HilbertSortFirstLine())
+    with tempfile.TemporaryDirectory() as tempdir:
+        with Animation(size=(size, size), output=f"{tempdir}/anim.gif", encoder=encoder) as anim:
+            for i, frame in enumerate(f.frames(nframes)):
+                if i > 0:
+                    anim.new_frame()
+                frame.draw_in_context(anim.context, curve_color=(0, 0, 0, 0.3), curve_width=1)
+
+
+def result_key(result):
+    return (result["name"], tuple(sorted(result["params"].items())))
+
+
+def run(args):
+    grid = QUICK_GRID if args.quick else FULL_GRID
+    results = []
+    for name, params, func in benchmarks(grid):
+        if args.only and name not in args.only:
+            continue
+        durations = timeit(func, args.repeat)
+        result = {
+            "name": name,
+            "params": params,
+            "best": min(durations),
+            "median": statistics.median(durations),
+            "repeat": args.repeat,
+        }
+        results.append(result)
+        print(f"{name:10} {format_params(params):60} {result['best'] * 1000:10.2f} ms")
+
+    data = {
+        "meta": {
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as out:
+        json.dump(data, out, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}")
+    return 0
+
+
+def compare(args):
+    with open(args.before) as f:
+        before = {result_key(r): r for r in json.load(f)["results"]}
+    with open(args.after) as f:
+        after = {result_key(r): r for r in json.load(f)["results"]}
+
+    regressions = 0
+    for key in [key for key in before if key in after]:
+        old, new = before[key], after[key]
+        ratio = new["best"] / old["best"]
+        flag = ""
+        if ratio > args.threshold:
+            flag = "  SLOWER"
+            regressions += 1
+        elif ratio < 1 / args.threshold:
+            flag = "  faster"
+        print(
+            f"{old['name']:10} {format_params(old['params']):60} "
+            f"{old['best'] * 1000:10.2f} -> {new['best'] * 1000:10.2f} ms  x{ratio:.2f}{flag}"
+        )
+    for key in [key for key in [*before, *after] if (key in before) != (key in after)]:
+        print(f"Only in one run: {key[0]} {dict(key[1])}")
+    print(f"{regressions} regression(s) beyond x{args.threshold}")
+    return 1 if regressions else 0
+
+
+def format_params(params):
+    return " ".join(f"{k}={v}" for k, v in params.items())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Fluidity pipeline")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run the benchmarks")
+    run_parser.add_argument("-o", "--output", default="benchmarks.json", help="JSON file to write")
+    run_parser.add_argument("-r", "--repeat", type=int, default=5, help="Timings per benchmark")
+    run_parser.add_argument("--quick", action="store_true", help="Use a small grid of sizes")
+    run_parser.add_argument(
+        "--only", nargs="+", choices=["noise", "sort", "curve", "draw", "animation"],
+        help="Run only these stages",
+    )
+    run_parser.set_defaults(func=run)
+
+    compare_parser = subparsers.add_parser("compare", help="Compare two runs")
+    compare_parser.add_argument("before", help="JSON results of the earlier run")
+    compare_parser.add_argument("after", help="JSON results of the later run")
+    compare_parser.add_argument(
+        "-t", "--threshold", type=float, default=1.1,
+        help="Ratio of times that counts as a change (default: 1.1)",
+    )
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -65,17 +65,19 @@ def draw_circle_squares(N, R, size=800):
         ctx.set_line_width(1)
         ctx.stroke()
 
-        for px, py, square_size in generate_circle_squares(N, R, size):
-            ctx.rectangle(
-                px - square_size / 2,
-                py - square_size / 2,
-                square_size,
-                square_size
-            )
-            ctx.set_source_rgba(0, 0, 0, 0.1)
-            ctx.fill()
-            ctx.set_source_rgba(0, 0, 0, 1)
-            ctx.circle(px, py, 3)
-            ctx.fill()
+        squares = list(generate_circle_squares(N, R, size))
+        pxs = [px for px, _, _ in squares]
+        pys = [py for _, py, _ in squares]
+        square_sizes = [square_size for _, _, square_size in squares]
+        ctx.rectangles(
+            [px - square_size / 2 for px, square_size in zip(pxs, square_sizes)],
+            [py - square_size / 2 for py, square_size in zip(pys, square_sizes)],
+            square_sizes,
+            square_sizes,
+            colors=(0, 0, 0, 0.1),
+        )
+        # The squares are all the same color, so they don't depend on the
+        # circles' order: draw the circles after all of them.
+        ctx.circles(pxs, pys, 3, colors=(0, 0, 0, 1))
 
     return ctx
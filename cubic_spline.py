@@ -0,0 +1,38 @@
+"""Closed natural cubic splines for many point lists at once."""
+
+import numpy as np
+
+from hobby import solve_cyclic_tridiagonal
+
+
+def closed_cubic_curves(points: np.ndarray) -> np.ndarray:
+    """Calculates closed interpolating cubic splines for many point lists at once.
+
+    `points` is shaped (..., num_points, 2).  The result is shaped
+    (..., num_points, 4, 2), as from `hobby.cyclic_hobby_curves`.  This is the
+    same computation as cubic_bezier_spline's `new_closed_interpolating_spline`:
+    solve the cyclic [1, 4, 1] system for B-spline points, then split each
+    span between them in thirds.
+    """
+    points = np.asarray(points, dtype=float)
+    num_points = points.shape[-2]
+    # One system per coordinate: put the points' axis last.
+    rhs = 6 * np.swapaxes(points, -1, -2)
+    if num_points < 3:
+        # Too small for the cyclic solver: the corner entries land on the
+        # diagonals, as the library's dense matrix adds them.
+        matrix = np.diag([4.0] * num_points) + np.diag([1.0] * (num_points - 1), -1) + np.diag([1.0] * (num_points - 1), 1)
+        matrix += np.diag([1.0], num_points - 1) + np.diag([1.0], -(num_points - 1))
+        b_points = np.linalg.solve(matrix, rhs[..., np.newaxis])[..., 0]
+    else:
+        ones = np.ones(num_points)
+        b_points = solve_cyclic_tridiagonal(ones, 4 * ones, ones, rhs)
+    b_points = np.swapaxes(b_points, -1, -2)
+
+    b_next = np.roll(b_points, -1, axis=-2)
+    ctrl_a = (2 * b_points + b_next) / 3
+    ctrl_b = (b_points + 2 * b_next) / 3
+    # Each segment starts where the previous segment's last third meets this one's first.
+    start = (np.roll(ctrl_b, 1, axis=-2) + ctrl_a) / 2
+    end = np.roll(start, -1, axis=-2)
+    return np.stack([start, ctrl_a, ctrl_b, end], axis=-2)
@@ -6,14 +6,14 @@ for fname, sorter, curver in [
     ("linear_cubic.gif", HilbertSortFirstLine(), cubic_curve),
 ]:
     with Animation(size=(600, 600), output=f"pix/{fname}") as anim:
-        for i in range(100):
+        f = Fluidity(
+            LinearNoise(seed=139, istep=0.005, istart=0),
+            npoints=7, nlines=40, curver=curver, sorter=sorter,
+        )
+        for i, frame in enumerate(f.frames(100)):
             if i > 0:
                 anim.new_frame()
-            f = Fluidity(
-                LinearNoise(seed=139, istep=0.005, istart=i * 0.005),
-                npoints=7, nlines=40, curver=curver, sorter=sorter,
-            )
-            f.draw_in_context(
+            frame.draw_in_context(
                 anim.context,
                 curve_color=(0, 0, 0, 0.3),
                 curve_width=1,
@@ -40,15 +40,14 @@ with cairo_context(W * 2, W, output="pix/point_trails.png") as ctx:
 
 for seed in [5, 9, 25]:
     with Animation(size=(W, W), output=f"pix/circular_{seed}.gif") as anim:
-        sorter = HilbertSortFirstLine()
-        for i in range(100):
+        f = Fluidity(
+            CircularNoise(seed=seed, istep=0.01, isteps=100),
+            npoints=7, nlines=40, curver=cubic_curve, sorter=HilbertSortFirstLine(),
+        )
+        for i, frame in enumerate(f.frames(100)):
             if i > 0:
                 anim.new_frame()
-            f = Fluidity(
-                CircularNoise(seed=seed, istep=0.01, isteps=100, istart=i),
-                npoints=7, nlines=40, curver=cubic_curve, sorter=sorter,
-            )
-            f.draw_in_context(
+            frame.draw_in_context(
                 anim.context,
                 curve_color=(0, 0, 0, 0.3),
                 curve_width=1,
@@ -1,15 +1,25 @@
 """Helpers for drawing in Jupyter notebooks with PyCairo."""
 
+import concurrent.futures
 import contextlib
+import functools
 import io
 import itertools
 import math
 import os.path
+import struct
 import subprocess
+import sys
 import tempfile
+import time
+import zlib
 
 import cairo
 import IPython.display
+import numpy as np
+from PIL import GifImagePlugin, Image
+
+from stats import stage
 
 
 # Compass points for making circle arcs
@@ -21,13 +31,14 @@ CE, CS, CW, CN = [i * DEG90 for i in range(4)]
 class _CairoContext:
     """Base class for Cairo contexts that can display in Jupyter, or write to a file."""
 
-    def __init__(self, width: int, height: int, output: str | None = None):
+    def __init__(self, width: int, height: int, output: str | None = None, stats=None):
         self.width = width
         self.height = height
         if isinstance(output, str):
             self.output = os.path.expandvars(os.path.expanduser(output))
         else:
             self.output = output
+        self.stats = stats
         self.surface = None
         self.ctx = None
 
@@ -65,6 +76,83 @@ class _CairoContext:
         """Add a complete circle to the path."""
         self.ctx.arc(x, y, r, 0, 2 * math.pi)
 
+    # Batch drawing: each of these draws many shapes with as few source
+    # changes and fills as possible.  `colors` can be None to use the current
+    # source, one color for all the shapes, or a sequence with a color for
+    # each shape.  Shapes are drawn in order, so overlaps stack as if they
+    # were drawn one by one.  If all the colors are opaque, each run of
+    # shapes of the same color is filled (or stroked) together.  If any is
+    # translucent, each shape is painted alone, so overlaps build up.
+
+    def circles(self, xs, ys, r, colors=None):
+        """Fill circles centered at (xs[i], ys[i]) with radius r, or r[i]."""
+        xs = np.asarray(xs, dtype=float).tolist()
+        ys = np.asarray(ys, dtype=float).tolist()
+        rs = np.broadcast_to(np.asarray(r, dtype=float), (len(xs),)).tolist()
+        new_sub_path = self.ctx.new_sub_path
+        arc = self.ctx.arc
+
+        def add_shape(i):
+            new_sub_path()
+            arc(xs[i], ys[i], rs[i], 0, 2 * math.pi)
+
+        self._paint_shapes(len(xs), add_shape, colors, self.ctx.fill)
+
+    def rectangles(self, xs, ys, ws, hs, colors=None):
+        """Fill rectangles with corners (xs[i], ys[i]) and sizes (ws[i], hs[i])."""
+        n = len(xs)
+        xs, ys, ws, hs = (
+            np.broadcast_to(np.asarray(v, dtype=float), (n,)).tolist() for v in (xs, ys, ws, hs)
+        )
+        rectangle = self.ctx.rectangle
+
+        def add_shape(i):
+            rectangle(xs[i], ys[i], ws[i], hs[i])
+
+        self._paint_shapes(n, add_shape, colors, self.ctx.fill)
+
+    def polylines(self, lines, *, closed=False, colors=None):
+        """Stroke each line of an array shaped (nlines, npoints, 2)."""
+        lines = np.asarray(lines, dtype=float).tolist()
+        move_to = self.ctx.move_to
+        line_to = self.ctx.line_to
+        close_path = self.ctx.close_path
+
+        def add_shape(i):
+            first, *rest = lines[i]
+            move_to(*first)
+            for pt in rest:
+                line_to(*pt)
+            if closed:
+                close_path()
+
+        self._paint_shapes(len(lines), add_shape, colors, self.ctx.stroke)
+
+    def _paint_shapes(self, n, add_shape, colors, paint):
+        """Add shapes 0..n-1 with `add_shape`, and `paint` them in `colors`."""
+        if colors is None or _is_color(colors):
+            if colors is not None:
+                self.ctx.set_source_rgba(*colors)
+            colors = [None] * n
+            source = self.ctx.get_source()
+            opaque = isinstance(source, cairo.SolidPattern) and source.get_rgba()[3] >= 1
+        else:
+            colors = [tuple(color) for color in colors]
+            opaque = all(len(color) == 3 or color[3] >= 1 for color in colors)
+
+        current = None
+        for i, color in enumerate(colors):
+            if color is not None and color != current:
+                if opaque and i:
+                    paint()
+                self.ctx.set_source_rgba(*color)
+                current = color
+            add_shape(i)
+            if not opaque:
+                paint()
+        if opaque and n:
+            paint()
+
     @contextlib.contextmanager
     def save_restore(self):
         self.ctx.save()
@@ -99,39 +187,45 @@ class _CairoContext:
 class _CairoSvg(_CairoContext):
     """For creating an SVG drawing in Jupyter."""
 
-    def __init__(self, width: int, height: int, output: str | None = None):
-        super().__init__(width, height, output)
+    def __init__(self, width: int, height: int, output: str | None = None, stats=None):
+        super().__init__(width, height, output, stats)
         self.svgio = io.BytesIO()
         self.surface = cairo.SVGSurface(self.svgio, *self.size())
         self.surface.set_document_unit(cairo.SVGUnit.PX)
         self.ctx = cairo.Context(self.surface)
 
     def __exit__(self, typ, val, tb):
-        self.surface.finish()
-        if self.output is not None:
-            with open(self.output, "wb") as svgout:
-                svgout.write(self.svgio.getvalue())
+        with stage(self.stats, "encode"):
+            self.surface.finish()
+            if self.output is not None:
+                with open(self.output, "wb") as svgout:
+                    svgout.write(self.svgio.getvalue())
 
     def _repr_svg_(self):
         if self.output is None:
-            return self.svgio.getvalue().decode()
+            return self._svg_text()
+
+    def _svg_text(self):
+        """The finished SVG document."""
+        return self.svgio.getvalue().decode()
 
 
 class _CairoPng(_CairoContext):
     """For creating a PNG drawing in Jupyter."""
 
-    def __init__(self, width: int, height: int, output: str | None = None):
-        super().__init__(width, height, output)
+    def __init__(self, width: int, height: int, output: str | None = None, stats=None):
+        super().__init__(width, height, output, stats)
         self.pngio = None
         self.surface = cairo.ImageSurface(cairo.Format.RGB24, *self.size())
         self.ctx = cairo.Context(self.surface)
 
     def __exit__(self, typ, val, tb):
-        if self.output is not None:
-            self.surface.write_to_png(self.output)
-        else:
-            self.pngio = io.BytesIO()
-            self.surface.write_to_png(self.pngio)
+        with stage(self.stats, "encode"):
+            if self.output is not None:
+                self.surface.write_to_png(self.output)
+            else:
+                self.pngio = io.BytesIO()
+                self.surface.write_to_png(self.pngio)
         self.surface.finish()
 
     def _repr_png_(self):
@@ -139,8 +233,17 @@ class _CairoPng(_CairoContext):
             return self.pngio.getvalue()
 
 
+def output_format(format, output):
+    """The format for `output`: its extension if that's "svg" or "png", else `format`."""
+    if isinstance(output, str):
+        ext = output.partition(".")[-1]
+        if ext in ["svg", "png"]:
+            return ext
+    return format
+
+
 def cairo_context(
-    width: int, height: int, format: str = "svg", output: str | None = None
+    width: int, height: int, format: str = "svg", output: str | None = None, stats=None
 ):
     """
     Create a PyCairo context for use in Jupyter.
@@ -150,22 +253,20 @@ def cairo_context(
         format (str): either "svg" or "png".
         output (optional str): if provided, the output will be written to this
             file.  If None, the output will be displayed in the Jupyter notebook.
+        stats (optional Stats): records the time spent encoding the output.
 
     Returns:
         A PyCairo context proxy.
     """
 
-    if output is not None:
-        ext = output.partition(".")[-1]
-        if ext in ["svg", "png"]:
-            format = ext
+    format = output_format(format, output)
     if format == "svg":
         cls = _CairoSvg
     elif format == "png":
         cls = _CairoPng
     else:
         raise ValueError(f"Unknown format: {format!r}")
-    return cls(width, height, output)
+    return cls(width, height, output, stats)
 
 
 class SubContext:
@@ -181,6 +282,20 @@ class SubContext:
         return getattr(self.parent, name)
 
 
+def _is_color(colors):
+    """Is `colors` a single color, rather than a sequence of them?"""
+    return len(colors) in [3, 4] and all(isinstance(c, (int, float)) for c in colors)
+
+
+def cairo_target(ctx):
+    """The cairo.Context that `ctx` draws on, looking through our proxies."""
+    if isinstance(ctx, SubContext):
+        return cairo_target(ctx.parent)
+    if isinstance(ctx, _CairoContext):
+        return ctx.ctx
+    return ctx
+
+
 def context_tiles(context, *, rows: int, cols: int, clip=True):
     bigw, bigh = context.size()
     smallw = bigw // cols
@@ -194,6 +309,61 @@ def context_tiles(context, *, rows: int, cols: int, clip=True):
             yield SubContext(context, smallw, smallh)
 
 
+def _render_tile(draw_tile, size, arg):
+    """Draw one tile on its own transparent surface, returning its pixels."""
+    surface = cairo.ImageSurface(cairo.Format.ARGB32, *size)
+    context = _CairoContext(*size)
+    context.surface = surface
+    context.ctx = cairo.Context(surface)
+    draw_tile(arg, context)
+    surface.flush()
+    return bytes(surface.get_data()), surface.get_stride()
+
+
+def render_tiles(context, draw_tile, args, *, rows: int, cols: int, workers=None):
+    """
+    Draw a grid of tiles, like `context_tiles` with clipping, in parallel.
+
+    Each tile is drawn by `draw_tile(arg, tile_context)` in a worker process,
+    on its own surface the size of a tile, and the finished tiles are painted
+    into `context` in order.  `args` has an argument for each tile, by rows.
+
+    Arguments:
+        context: the context to draw the grid on.
+        draw_tile: the drawing function.  It's sent to other processes, so it
+            must be picklable: a module-level function or a functools.partial
+            of one.  So must the `args`.
+        args: the arguments for the tiles, at most rows * cols of them.
+        rows (int), cols (int): the shape of the grid.
+        workers (optional int): the number of processes, default one per CPU.
+
+    Only image surfaces can be composited pixel for pixel, so on other
+    surfaces (SVG) the tiles are drawn here, one after another.
+    """
+    if not isinstance(cairo_target(context).get_target(), cairo.ImageSurface):
+        for arg, tile_context in zip(args, context_tiles(context, rows=rows, cols=cols)):
+            draw_tile(arg, tile_context)
+        return
+
+    bigw, bigh = context.size()
+    smallw = bigw // cols
+    smallh = bigh // rows
+    render = functools.partial(_render_tile, draw_tile, (smallw, smallh))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        tiles = executor.map(render, args)
+        for (irow, icol), (data, stride) in zip(itertools.product(range(rows), range(cols)), tiles):
+            tile = cairo.ImageSurface.create_for_data(
+                bytearray(data), cairo.Format.ARGB32, smallw, smallh, stride
+            )
+            with context.save_restore():
+                context.translate(icol * smallw, irow * smallh)
+                context.rectangle(0, 0, smallw, smallh)
+                context.clip()
+                context.set_source_surface(tile, 0, 0)
+                context.paint()
+            tile.finish()
+
+
 def svg_row(*svgs):
     hrow = '<div style="display:flex; flex-direction: row; justify-content: space-evenly">{}</div>'
     return IPython.display.HTML(hrow.format("".join(s._repr_svg_() for s in svgs)))
@@ -209,32 +379,352 @@ def svg_table_html(rows):
 def svg_table(rows):
     return IPython.display.HTML(svg_table_html(rows))
 
+class _CairoFrame(_CairoContext):
+    """For drawing an animation frame on a reused image surface."""
+
+    def __init__(self, surface, stats=None):
+        super().__init__(surface.get_width(), surface.get_height(), stats=stats)
+        self.surface = surface
+        # Start from the same all-black pixels as a new RGB24 surface.
+        clear = cairo.Context(surface)
+        clear.set_operator(cairo.Operator.CLEAR)
+        clear.paint()
+        self.ctx = cairo.Context(surface)
+
+    def __exit__(self, typ, val, tb):
+        self.surface.flush()
+
+    def image(self):
+        """A PIL RGB image copied from the surface's pixels."""
+        return Image.fromarray(_surface_rgb(self.surface, self.surface.get_height()), "RGB")
+
+
+def _surface_rgb(surface, nrows):
+    """The first `nrows` rows of an RGB24 surface, as an (nrows, width, 3) array."""
+    width = surface.get_width()
+    data = np.frombuffer(surface.get_data(), dtype=np.uint8)
+    words = data.reshape(surface.get_height(), surface.get_stride())[:nrows, :width * 4]
+    # RGB24 pixels are native-endian 32-bit xRGB words.
+    channels = [2, 1, 0] if sys.byteorder == "little" else [1, 2, 3]
+    return words.reshape(nrows, width, 4)[..., channels]
+
+
+class _PngWriter:
+    """Write an 8-bit RGB PNG to a binary stream, a band of rows at a time."""
+
+    def __init__(self, out, width, height, level=6):
+        self.out = out
+        self.out.write(b"\x89PNG\r\n\x1a\n")
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        self.compressor = zlib.compressobj(level)
+
+    def _chunk(self, kind, data):
+        self.out.write(struct.pack(">I", len(data)) + kind + data)
+        self.out.write(struct.pack(">I", zlib.crc32(kind + data)))
+
+    def add_rows(self, rgb):
+        """Add rows from an (nrows, width, 3) uint8 array."""
+        nrows = rgb.shape[0]
+        pixels = rgb.reshape(nrows, -1)
+        # Each row is filter type 1 ("Sub"): bytes are differences from the
+        # same channel of the pixel to the left.
+        rows = np.empty((nrows, pixels.shape[1] + 1), dtype=np.uint8)
+        rows[:, 0] = 1
+        rows[:, 1:4] = pixels[:, :3]
+        np.subtract(pixels[:, 3:], pixels[:, :-3], out=rows[:, 4:])
+        data = self.compressor.compress(rows.tobytes())
+        if data:
+            self._chunk(b"IDAT", data)
+
+    def close(self):
+        self._chunk(b"IDAT", self.compressor.flush())
+        self._chunk(b"IEND", b"")
+
+
+class _CairoBand(_CairoFrame):
+    """A horizontal band of a larger drawing, on a reused image surface."""
+
+    def __init__(self, surface, top, size, stats=None):
+        super().__init__(surface, stats)
+        # Report the full drawing's size, and draw it shifted up so that the
+        # band's rows land on the surface.  The surface itself clips.
+        self.width, self.height = size
+        self.ctx.translate(0, -top)
+
+
+class _BandedPng:
+    """The result of `banded_png`, displayable in Jupyter."""
+
+    def __init__(self, output):
+        self.output = output
+        self.pngio = None
+
+    def _repr_png_(self):
+        if self.output is None:
+            return self.pngio.getvalue()
+
+    def _repr_html_(self):
+        if self.output is not None:
+            return f"<b><i>Wrote to {self.output}</i></b>"
+
+
+def banded_png(draw, *, size, output=None, band_height=512, stats=None):
+    """
+    Render a PNG one horizontal band at a time, to bound memory for huge sizes.
+
+    `draw(context)` is called once for each band, and draws the whole
+    picture: the context reports the full size, but only the band's rows are
+    kept.  Drawing can skip shapes outside the context's `clip_extents()`.
+    The pixels are the same as drawing once in `cairo_context(format="png")`,
+    but only one band's surface is ever allocated, and rows are compressed
+    into the PNG as each band is finished.
+
+    Arguments:
+        draw: a function of one argument, the context to draw on.
+        size (width, height): the size of the drawing in pixels.
+        output (optional str): the PNG file to write.  If None, the result
+            displays in Jupyter.
+        band_height (int): the number of rows to draw at once.
+        stats (optional Stats): records "band" and "encode" stages.
+
+    Returns:
+        An object that displays the PNG in Jupyter.
+    """
+    width, height = size
+    result = _BandedPng(output and os.path.expandvars(os.path.expanduser(output)))
+    band_height = min(band_height, height)
+    surface = cairo.ImageSurface(cairo.Format.RGB24, width, band_height)
+    with contextlib.ExitStack() as stack:
+        if result.output is None:
+            out = result.pngio = io.BytesIO()
+        else:
+            out = stack.enter_context(open(result.output, "wb"))
+        writer = _PngWriter(out, width, height)
+        for top in range(0, height, band_height):
+            with stage(stats, "band"):
+                with _CairoBand(surface, top, size, stats) as context:
+                    draw(context)
+            with stage(stats, "encode"):
+                writer.add_rows(_surface_rgb(surface, min(band_height, height - top)))
+        writer.close()
+    surface.finish()
+    return result
+
+
+class _GifWriter:
+    """
+    Write an animated GIF one frame at a time.
+
+    All frames share the palette of the first frame.  Each later frame is
+    written as just the rectangle that changed, with unchanged pixels
+    transparent.  Only the previous frame is kept, so memory doesn't grow
+    with the number of frames.
+    """
+
+    TRANSPARENT = 255
+
+    def __init__(self, output, frame_time):
+        self.file = open(output, "wb")
+        self.duration = frame_time * 10  # frame_time is in 1/100ths of a second.
+        self.palette = None
+        self.quantize_palette = None
+        self.previous = None
+        self.pending = None
+
+    def add_frame(self, image):
+        if self.palette is None:
+            # Leave the last palette index free for transparency.
+            first = image.quantize(colors=self.TRANSPARENT, dither=Image.Dither.NONE)
+            colors = first.getpalette()[:3 * self.TRANSPARENT]
+            # Quantize against only the real colors, so no pixel can land on
+            # the transparent index.
+            self.quantize_palette = Image.new("P", (1, 1))
+            self.quantize_palette.putpalette(colors)
+            self.palette = first.copy()
+            self.palette.putpalette(colors + [0] * (768 - len(colors)))
+            header, _ = GifImagePlugin.getheader(self.palette, None, {"loop": 0})
+            self.file.writelines(header)
+        frame = np.asarray(image.quantize(palette=self.quantize_palette, dither=Image.Dither.NONE))
+
+        if self.previous is None:
+            self._write_pending()
+            self.pending = [frame, (0, 0), self.duration, None]
+        else:
+            changed = frame != self.previous
+            if not changed.any():
+                self.pending[2] += self.duration
+                return
+            rows = np.flatnonzero(changed.any(axis=1))
+            cols = np.flatnonzero(changed.any(axis=0))
+            y0, y1 = rows[0], rows[-1] + 1
+            x0, x1 = cols[0], cols[-1] + 1
+            delta = frame[y0:y1, x0:x1].copy()
+            delta[~changed[y0:y1, x0:x1]] = self.TRANSPARENT
+            self._write_pending()
+            self.pending = [delta, (int(x0), int(y0)), self.duration, self.TRANSPARENT]
+        self.previous = frame
+
+    def _write_pending(self):
+        # A frame is written once the next one is known to differ from it,
+        # so identical frames can be merged into one longer frame.
+        if self.pending is None:
+            return
+        pixels, offset, duration, transparency = self.pending
+        im = Image.fromarray(pixels, "P")
+        im.putpalette(self.palette.getpalette())
+        params = {"duration": duration, "disposal": 1}
+        if transparency is not None:
+            params["transparency"] = transparency
+        self.file.writelines(GifImagePlugin.getdata(im, offset, **params))
+        self.pending = None
+
+    def close(self):
+        self._write_pending()
+        self.file.write(b";")
+        self.file.close()
+
+
+class _PillowWriter:
+    """
+    Write an animation in any format Pillow can save with save_all.
+
+    Pillow's writers for APNG and WebP need all the frames at once, so frames
+    are kept in memory until the end.
+    """
+
+    def __init__(self, output, frame_time):
+        self.output = output
+        self.duration = frame_time * 10
+        self.frames = []
+
+    def add_frame(self, image):
+        self.frames.append(image)
+
+    def close(self):
+        first, *rest = self.frames
+        first.save(
+            self.output, save_all=True, append_images=rest, duration=self.duration, loop=0
+        )
+
+
 class Animation:
-    def __init__(self, *, size, output, frame_time=5):
+    """
+    Collect drawn frames into an animated image.
+
+    Arguments:
+        size: the (width, height) of the frames in pixels.
+        output (str): the file to write.
+        frame_time (int): the time per frame, in 1/100ths of a second.
+        encoder (str): "magick" writes each frame as a PNG and combines them
+            with ImageMagick.  "pillow" encodes the frames in-process from one
+            reused surface: GIFs are streamed to the file, other formats (APNG
+            as .png, .webp) are saved by Pillow at the end.
+        stats (optional Stats): records the time of each frame and its
+            encoding, and the frames per second.  Pass the same Stats to the
+            Fluidity objects drawn in the frames to include their stages.
+    """
+
+    def __init__(self, *, size, output, frame_time=5, encoder="magick", stats=None):
+        if encoder not in ["magick", "pillow"]:
+            raise ValueError(f"Unknown encoder: {encoder!r}")
         self.size = size
         self.output = output
         self.frame_time = frame_time
+        self.encoder = encoder
+        self.stats = stats
         self.context = None
 
     def __enter__(self):
         self.frame_num = 0
-        self.tempdir_ctx = tempfile.TemporaryDirectory()
-        self.tempdir = self.tempdir_ctx.__enter__()
+        self.start_time = time.perf_counter()
+        if self.encoder == "pillow":
+            if self.output.lower().endswith(".gif"):
+                self.writer = _GifWriter(self.output, self.frame_time)
+            else:
+                self.writer = _PillowWriter(self.output, self.frame_time)
+            self.surface = cairo.ImageSurface(cairo.Format.RGB24, *self.size)
+        else:
+            self.tempdir_ctx = tempfile.TemporaryDirectory()
+            self.tempdir = self.tempdir_ctx.__enter__()
         self.new_frame()
         return self
 
     def new_frame(self):
         if self.context is not None:
-            self.context.__exit__(None, None, None)
+            self._end_frame()
             self.frame_num += 1
-        self.context = cairo_context(*self.size, format="png", output=f"{self.tempdir}/frame_{self.frame_num:04d}.png")
+        if self.encoder == "pillow":
+            self.context = _CairoFrame(self.surface, stats=self.stats)
+        else:
+            self.context = cairo_context(
+                *self.size, format="png", output=f"{self.tempdir}/frame_{self.frame_num:04d}.png", stats=self.stats
+            )
         self.context.__enter__()
+        self.frame_start = time.perf_counter()
+
+    def _end_frame(self):
+        self.context.__exit__(None, None, None)
+        if self.encoder == "pillow":
+            with stage(self.stats, "encode"):
+                self.writer.add_frame(self.context.image())
+        self._record_frame()
+
+    def _record_frame(self):
+        if self.stats is not None:
+            self.stats.record("frame", time.perf_counter() - self.frame_start)
 
     def __exit__(self, typ, val, tb):
-        subprocess.run(f"cp {self.tempdir}/frame_0000.png /tmp", shell=True)
-        subprocess.run(
-            f"magick -delay {self.frame_time} {self.tempdir}/frame_*.png -strip -coalesce -layers Optimize {self.output}",
-            shell=True,
-        )
-        print(f"Wrote {self.frame_num + 1} frames to {self.output}")
-        self.tempdir_ctx.__exit__(typ, val, tb)
+        # Finish the last frame, so it's written like all the others.
+        self._end_frame()
+        if self.encoder == "pillow":
+            with stage(self.stats, "encode"):
+                self.writer.close()
+            self.surface.finish()
+            print(f"Wrote {self.frame_num + 1} frames to {self.output}")
+        else:
+            with stage(self.stats, "encode"):
+                _combine_frames(self.tempdir, self.frame_num + 1, self.output, self.frame_time)
+            self.tempdir_ctx.__exit__(typ, val, tb)
+        if self.stats is not None:
+            elapsed = time.perf_counter() - self.start_time
+            self.stats.count("frames", self.frame_num + 1)
+            self.stats.rates["frames/sec"] = (self.frame_num + 1) / elapsed
+
+
+def _combine_frames(tempdir, nframes, output, frame_time):
+    """Combine the frame_NNNN.png files in `tempdir` into an animation."""
+    subprocess.run(f"cp {tempdir}/frame_0000.png /tmp", shell=True)
+    subprocess.run(
+        f"magick -delay {frame_time} {tempdir}/frame_*.png -strip -coalesce -layers Optimize {output}",
+        shell=True,
+    )
+    print(f"Wrote {nframes} frames to {output}")
+
+
+def _render_frame(draw_frame, size, output, frame_num):
+    with cairo_context(*size, format="png", output=output) as context:
+        draw_frame(frame_num, context)
+
+
+def render_animation(draw_frame, nframes, *, size, output, frame_time=5, workers=None):
+    """
+    Render an animation, drawing its frames in parallel worker processes.
+
+    Arguments:
+        draw_frame: called as `draw_frame(frame_num, context)` to draw each
+            frame.  It's sent to other processes, so it must be picklable: a
+            module-level function or a functools.partial of one.
+        nframes (int): the number of frames.
+        size, output, frame_time: as for `Animation`.
+        workers (optional int): the number of processes, default one per CPU.
+
+    The result is the same as drawing the frames in order with `Animation`.
+    """
+    with tempfile.TemporaryDirectory() as tempdir:
+        outputs = [f"{tempdir}/frame_{n:04d}.png" for n in range(nframes)]
+        render = functools.partial(_render_frame, draw_frame, size)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            # Frames are files named by number, so completion order doesn't matter.
+            for _ in executor.map(render, outputs, range(nframes)):
+                pass
+        _combine_frames(tempdir, nframes, output, frame_time)
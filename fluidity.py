@@ -1,15 +1,29 @@
+import copy
 import dataclasses
+import itertools
 import math
+import os.path
+import sys
+import warnings
 from typing import Any, Callable
 
-from drawing import cairo_context
+from drawing import banded_png, cairo_context, cairo_target, output_format, render_tiles
+from geometry_cache import GeometryCache, cache_key
+from stats import Stats, count, stage
+from svgwriter import AnimatedSvg, SvgDrawing, svg_color
 
 import super_simplex
 import numpy as np
-from hilbertcurve.hilbertcurve import HilbertCurve
-from hobby import HobbyCurve
+import density
+from cubic_spline import closed_cubic_curves
+from hobby import HobbyCurve, cyclic_hobby_curves
 from cubic_bezier_spline import new_closed_interpolating_spline
 
+try:
+    import numba_kernels
+except ImportError:
+    numba_kernels = None
+
 
 def hobby_curve(points):
     ctrls = HobbyCurve(points, cyclic=True).get_ctrl_points()
@@ -21,11 +35,28 @@ def hobby_curve(points):
     return curve
 
 
+def hobby_curves(lines):
+    """Compute `hobby_curve` for all the lines at once, as an ndarray."""
+    return cyclic_hobby_curves(np.asarray(lines, dtype=float))
+
+
+# Curvers can have a `batch` function to compute all the lines together.
+hobby_curve.batch = hobby_curves
+
+
 def cubic_curve(points):
     cbc = new_closed_interpolating_spline(points)
     return cbc.cpts
 
 
+def cubic_curves(lines):
+    """Closed cubic curves for an (nlines, npoints, 2) array, like `cubic_curve`."""
+    return closed_cubic_curves(np.asarray(lines, dtype=float))
+
+
+cubic_curve.batch = cubic_curves
+
+
 def draw_lines(ctx, points, *, closed):
     ctx.move_to(*points[0])
     for pt in points[1:]:
@@ -50,31 +81,209 @@ def draw_dlist(ctx, dlist):
 
 
 def draw_dlists(ctx, dlists):
+    if isinstance(dlists, PackedDlists):
+        dlists.replay(ctx)
+        return
+    # Look up each op's method once, on the cairo context if it has it, so
+    # the proxies' __getattr__ isn't called for every op.
+    target = cairo_target(ctx)
+    methods = {}
     for dlist in dlists:
-        draw_dlist(ctx, dlist)
-        ctx.stroke()
+        for op, *args in dlist:
+            method = methods.get(op)
+            if method is None:
+                method = methods[op] = getattr(target, op, None) or getattr(ctx, op)
+            method(*args)
+        target.stroke()
+
+
+class PackedDlists:
+    """
+    Display lists packed into an opcode array and a coordinate array.
+
+    Each op takes its arguments from the next coordinates: two for move_to
+    and line_to, six for curve_to, none for close_path and stroke.  A stroke
+    ends each display list, as in `draw_dlists`.  The arrays can be turned
+    into bytes with `to_bytes` and back with `from_bytes`.
+    """
+
+    OPS = ("move_to", "line_to", "curve_to", "close_path", "stroke")
+    NARGS = (2, 2, 6, 0, 0)
+    MOVE_TO, LINE_TO, CURVE_TO, CLOSE_PATH, STROKE = range(len(OPS))
+    MAGIC = b"FDL1"
+
+    def __init__(self, ops, coords):
+        self.ops = np.asarray(ops, dtype=np.uint8)
+        self.coords = np.asarray(coords, dtype=np.float64)
+
+    @classmethod
+    def from_dlists(cls, dlists):
+        """Pack a list of display lists like those from `curve_dlist`."""
+        ops = []
+        coords = []
+        for dlist in dlists:
+            for op, *args in dlist:
+                ops.append(cls.OPS.index(op))
+                coords.extend(args)
+            ops.append(cls.STROKE)
+        return cls(ops, coords)
+
+    @classmethod
+    def from_ctrl_points(cls, ctrl_points):
+        """Pack the closed curves of an (nlines, npoints, 4, 2) array."""
+        nlines, npoints = ctrl_points.shape[:2]
+        line_ops = [cls.MOVE_TO] + [cls.CURVE_TO] * npoints + [cls.CLOSE_PATH, cls.STROKE]
+        ops = np.tile(np.array(line_ops, dtype=np.uint8), nlines)
+        coords = np.concatenate(
+            [ctrl_points[:, 0, 0, :], ctrl_points[:, :, 1:, :].reshape(nlines, npoints * 6)],
+            axis=1,
+        )
+        return cls(ops, coords.ravel())
+
+    def commands(self):
+        """Yield (op_name, args) for each op."""
+        coords = self.coords.tolist()
+        pos = 0
+        for op in self.ops.tolist():
+            nargs = self.NARGS[op]
+            yield self.OPS[op], coords[pos:pos + nargs]
+            pos += nargs
+
+    def replay(self, ctx):
+        """Draw the display lists on `ctx`, a cairo context or a proxy for one."""
+        # Resolve the cairo methods once, skipping the proxies' __getattr__.
+        target = cairo_target(ctx)
+        methods = [getattr(target, name) for name in self.OPS]
+        nargs = self.NARGS
+        coords = self.coords.tolist()
+        pos = 0
+        for op in self.ops.tolist():
+            n = nargs[op]
+            methods[op](*coords[pos:pos + n])
+            pos += n
+
+    def __len__(self):
+        return len(self.ops)
+
+    def to_bytes(self):
+        header = self.MAGIC + np.array([len(self.ops), len(self.coords)], dtype="<u8").tobytes()
+        return header + self.ops.tobytes() + self.coords.astype("<f8").tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        if data[:4] != cls.MAGIC:
+            raise ValueError("Not a packed display list")
+        nops, ncoords = np.frombuffer(data, dtype="<u8", count=2, offset=4)
+        ops = np.frombuffer(data, dtype=np.uint8, count=nops, offset=20)
+        coords = np.frombuffer(data, dtype="<f8", count=ncoords, offset=20 + nops)
+        return cls(ops, coords)
+
+
+def hilbert_keys(coords, bits):
+    """
+    Distances along a 2-D Hilbert curve for integer coordinates.
+
+    `coords` is an integer array shaped (..., 2), with values from 0 to
+    2**bits - 1.  The distances match hilbertcurve's `distances_from_points`
+    (Skilling's algorithm), computed for the whole array at once.
+    """
+    coords = np.asarray(coords, dtype=np.int64)
+    x = coords[..., 0].copy()
+    y = coords[..., 1].copy()
+
+    # Inverse undo excess work
+    q = 1 << (bits - 1)
+    while q > 1:
+        p = q - 1
+        # i = 0: x is both the point and point[0].
+        x = np.where(x & q, x ^ p, x)
+        # i = 1
+        y_set = (y & q) != 0
+        t = (x ^ y) & p
+        x = np.where(y_set, x ^ p, x ^ t)
+        y = np.where(y_set, y, y ^ t)
+        q >>= 1
+
+    # Gray encode
+    y ^= x
+    t = np.zeros_like(y)
+    q = 1 << (bits - 1)
+    while q > 1:
+        t = np.where(y & q, t ^ (q - 1), t)
+        q >>= 1
+    x ^= t
+    y ^= t
+    return _interleave(x, y, bits)
+
+
+def morton_keys(coords, bits):
+    """Distances along a 2-D Morton (Z-order) curve for integer coordinates."""
+    coords = np.asarray(coords, dtype=np.int64)
+    return _interleave(coords[..., 0], coords[..., 1], bits)
+
+
+def _interleave(x, y, bits):
+    """Interleave the bits of x and y, with x's bits more significant."""
+    keys = np.zeros(np.shape(x), dtype=np.int64)
+    for b in range(bits):
+        keys |= ((x >> b) & 1) << (2 * b + 1)
+        keys |= ((y >> b) & 1) << (2 * b)
+    return keys
+
+
+def _engine_kernels(engine):
+    """The compiled kernels module for `engine`, or None for plain numpy."""
+    if engine == "numpy":
+        return None
+    if engine == "numba":
+        if numba_kernels is None:
+            warnings.warn("numba isn't available, using the numpy engine")
+        return numba_kernels
+    raise ValueError(f"Unknown engine: {engine!r}")
+
+
+def _compiled(func, kernels):
+    """The compiled version of `func` in `kernels`, if there is one."""
+    if kernels is None:
+        return func
+    return getattr(kernels, func.__name__, func)
 
 
 class HilbertSorter:
-    def __init__(self):
+    """
+    Base for sorters that order a line's points along a space-filling curve.
+
+    Arguments:
+        bits (int or None): the curve's resolution is 2**bits per dimension.
+            The default of 6 gives a 64x64 grid.  None chooses enough bits
+            for the number of points, so that dense lines don't have many
+            points tied in one grid cell.
+        keys: the curve, `hilbert_keys` or `morton_keys`.
+    """
+
+    def __init__(self, bits=6, keys=hilbert_keys):
+        self.bits = bits
+        self.keys = keys
         self.sorted_indices = None
 
-    def choose_order(self, points):
-        P = 6  # 2^6 = 64 resolution per dimension
-        hilbert_curve = HilbertCurve(P, 2)
-        max_coord = 2**P - 1
-        pointsa = np.array(points)
-        min_vals = pointsa.min(axis=0)
-        max_vals = pointsa.max(axis=0)
+    def _orders(self, pointsa, kernels=None):
+        """Sorting indices for points shaped (..., npoints, 2)."""
+        bits = self.bits
+        if bits is None:
+            bits = min(max(6, math.ceil(math.log2(pointsa.shape[-2])) + 4), 31)
+        max_coord = 2**bits - 1
+        min_vals = pointsa.min(axis=-2, keepdims=True)
+        max_vals = pointsa.max(axis=-2, keepdims=True)
 
         normalized_points = (
             (pointsa - min_vals) / (max_vals - min_vals) * max_coord
         ).astype(int)
 
-        hilbert_distances = hilbert_curve.distances_from_points(
-            normalized_points.tolist()
-        )
-        self.sorted_indices = np.argsort(hilbert_distances)
+        keys = _compiled(self.keys, kernels)
+        return np.argsort(keys(normalized_points, bits), axis=-1)
+
+    def choose_order(self, points):
+        self.sorted_indices = self._orders(np.array(points))
 
     def _sort(self, points):
         pointsa = np.array(points)
@@ -87,6 +296,11 @@ class HilbertSortEveryLine(HilbertSorter):
         self.choose_order(points)
         return self._sort(points)
 
+    def sort_lines(self, lines, kernels=None):
+        """Sort every line of an (nlines, npoints, 2) array at once."""
+        orders = self._orders(lines, kernels)
+        return np.take_along_axis(lines, orders[..., np.newaxis], axis=-2)
+
 
 class HilbertSortFirstLine(HilbertSorter):
     def __call__(self, points):
@@ -94,17 +308,150 @@ class HilbertSortFirstLine(HilbertSorter):
             self.choose_order(points)
         return self._sort(points)
 
+    def sort_lines(self, lines, kernels=None):
+        """Sort every line of an (nlines, npoints, 2) array at once."""
+        if self.sorted_indices is None:
+            self.choose_order(lines[0])
+        return lines[:, self.sorted_indices]
+
+
+class NoiseLattice:
+    """
+    Noise sampled at evenly spaced positions along one coordinate, for
+    interpolating between them.
+
+    `sample(us)` gives the exact values at positions `us`, shaped
+    (len(us), ...).  Nodes are at multiples of `spacing`.  With a `period`,
+    positions wrap around and every node is sampled up front.  Without one,
+    nodes are sampled as lookups reach them.
+    """
+
+    def __init__(self, sample, spacing, period=None):
+        self.sample = sample
+        self.spacing = spacing
+        self.period = period
+        self.k_lo = 0
+        self.values = None
+        if period is not None:
+            self.values = sample(np.arange(round(period / spacing)) * spacing)
+
+    def _ensure(self, k_min, k_max):
+        """Make sure nodes k_min through k_max are sampled."""
+        if self.values is None:
+            self.k_lo = k_min
+            self.values = self.sample(np.arange(k_min, k_max + 1) * self.spacing)
+            return
+        k_hi = self.k_lo + len(self.values) - 1
+        # Grow by at least the current size, so that lookups creeping
+        # forward a line at a time don't sample over and over.
+        grow = len(self.values)
+        if k_min < self.k_lo:
+            new_lo = min(k_min, self.k_lo - grow)
+            more = self.sample(np.arange(new_lo, self.k_lo) * self.spacing)
+            self.values = np.concatenate([more, self.values])
+            self.k_lo = new_lo
+        if k_max > k_hi:
+            new_hi = max(k_max, k_hi + grow)
+            more = self.sample(np.arange(k_hi + 1, new_hi + 1) * self.spacing)
+            self.values = np.concatenate([self.values, more])
+
+    def __call__(self, us):
+        """Values at positions `us`, interpolated with Catmull-Rom cubics."""
+        u = np.asarray(us, dtype=float) / self.spacing
+        k = np.floor(u).astype(int)
+        ks = k[:, np.newaxis] + np.arange(-1, 3)
+        if self.period is None:
+            self._ensure(int(k.min()) - 1, int(k.max()) + 2)
+            nodes = self.values[ks - self.k_lo]
+        else:
+            nodes = self.values[ks % len(self.values)]
+        t = (u - k)[:, np.newaxis]
+        t2 = t * t
+        t3 = t2 * t
+        weights = np.concatenate(
+            [-t3 + 2 * t2 - t, 3 * t3 - 5 * t2 + 2, -3 * t3 + 4 * t2 + t, t3 - t2], axis=1
+        ) / 2
+        return np.einsum("nk,nk...->n...", weights, nodes)
+
+    @classmethod
+    def fit(cls, sample, tolerance, start, min_spacing, period=None):
+        """
+        A lattice fine enough that interpolating is within `tolerance`.
+
+        Spacings are halved until the error halfway between nodes, where
+        it's largest, is under half the tolerance at 256 nodes from position
+        `start`.  It's a check on samples, not a guarantee.  Returns None if the
+        spacing would have to be below `min_spacing`, the spacing of the
+        positions to be looked up: evaluating them exactly is cheaper.
+        """
+        spacing = 0.25 if period is None else period / 8
+        while spacing >= min_spacing:
+            lattice = cls(sample, spacing, period)
+            probes = (math.floor(start / spacing) + np.arange(256) + 0.5) * spacing
+            if np.abs(lattice(probes) - sample(probes)).max() <= tolerance / 2:
+                return lattice
+            spacing /= 2
+        return None
+
 
 @dataclasses.dataclass(kw_only=True)
 class Noise:
     seed: int = 1
+    # Set to interpolate from a precomputed lattice of noise values instead of
+    # evaluating every point exactly, with errors up to about this much.
+    lattice_tolerance: float | None = None
 
     def __post_init__(self):
         self.gen_simplex = super_simplex.Gener([self.seed])
+        # Lattices by tuple of j indices: j samples are 17 apart and unrelated,
+        # so only the i direction is interpolated.
+        self._lattices = {}
+
+    def __getstate__(self):
+        # Lattices hold closures, and are quick to rebuild.
+        state = self.__dict__.copy()
+        state["_lattices"] = {}
+        return state
+
+    def _lattice(self, j_indices, make):
+        """The lattice for `j_indices`, made with `make()` the first time."""
+        key = tuple(j_indices)
+        if key not in self._lattices:
+            self._lattices[key] = make()
+        return self._lattices[key]
 
     def _simplex(self, x, y):
         return self.gen_simplex.noise_2d(x, y)[0]
 
+    def _simplex_grid(self, xs, ys):
+        """Simplex values at every (x, y) pair, shaped (len(xs), len(ys))."""
+        xs = np.asarray(xs, dtype=float)
+        ys = np.asarray(ys, dtype=float)
+        return self.gen_simplex.noise_2d_array(xs, ys)[0].T
+
+    def points(self, i_indices, j_indices):
+        """
+        Compute `point(i, j)` for every i and j at once.
+
+        Returns an ndarray shaped (len(i_indices), len(j_indices), 2).
+        Subclasses override this with whole-array versions.
+        """
+        return np.array(
+            [[self.point(i, j) for j in j_indices] for i in i_indices],
+            dtype=float,
+        ).reshape(len(i_indices), len(j_indices), 2)
+
+    def line_key(self, i):
+        """A hashable key for line i: lines with equal keys are identical."""
+        return i
+
+    # The number of distinct lines, or None if every line is different.
+    line_period = None
+
+    def advanced(self, nlines):
+        """A copy of this noise, starting nlines further along i."""
+        raise NotImplementedError(f"{self.__class__.__name__} can't be advanced")
+
 
 @dataclasses.dataclass(kw_only=True)
 class LinearNoise(Noise):
@@ -124,6 +471,35 @@ class LinearNoise(Noise):
             self._simplex(sx + 1, sy),
         )
 
+    def _sample_coords(self, i_indices, j_indices):
+        sx = np.asarray(i_indices, dtype=float)[:, np.newaxis] * self.istep + self.istart
+        sy = np.asarray(j_indices, dtype=float) * self.jstep + self.jstart
+        sx, sy = np.broadcast_arrays(sx, sy)
+        return sx, sx + 1, sy
+
+    def points(self, i_indices, j_indices):
+        sx = np.asarray(i_indices, dtype=float) * self.istep + self.istart
+        sy = np.asarray(j_indices, dtype=float) * self.jstep + self.jstart
+
+        def sample(sx):
+            # sx depends only on i, sy only on j, so each channel is one grid.
+            return np.stack(
+                [self._simplex_grid(sx, sy), self._simplex_grid(sx + 1, sy)],
+                axis=-1,
+            )
+
+        if self.lattice_tolerance is not None and len(sx):
+            lattice = self._lattice(
+                j_indices,
+                lambda: NoiseLattice.fit(sample, self.lattice_tolerance, sx.min(), abs(self.istep)),
+            )
+            if lattice is not None:
+                return lattice(sx)
+        return sample(sx)
+
+    def advanced(self, nlines):
+        return dataclasses.replace(self, istart=self.istart + nlines * self.istep)
+
 
 @dataclasses.dataclass(kw_only=True)
 class CircularNoise(Noise):
@@ -151,6 +527,110 @@ class CircularNoise(Noise):
             self._simplex(sx + 1 + dx, sy + dy),
         )
 
+    def _sample_coords(self, i_indices, j_indices):
+        sx = 42.17
+        sy = np.asarray(j_indices, dtype=float) * self.jstep + self.jstart
+        dxs = {}
+        dys = {}
+        for step in {(self.istart + i) % self.isteps for i in i_indices}:
+            theta = 2 * math.pi / self.isteps * step
+            dxs[step] = self.r * math.cos(theta)
+            dys[step] = self.r * math.sin(theta)
+        steps = [(self.istart + i) % self.isteps for i in i_indices]
+        dx = np.array([dxs[step] for step in steps], dtype=float)[:, np.newaxis]
+        dy = np.array([dys[step] for step in steps], dtype=float)[:, np.newaxis]
+        shape = (len(steps), len(sy))
+        return (
+            np.broadcast_to(sx + dx, shape),
+            np.broadcast_to(sx + 1 + dx, shape),
+            sy + dy,
+        )
+
+    def _circle_points(self, steps, sy):
+        """Exact points for (possibly fractional) `steps` around the circle."""
+        sx = 42.17
+        rows = []
+        for step in np.asarray(steps, dtype=float).tolist():
+            theta = 2 * math.pi / self.isteps * step
+            dx = self.r * math.cos(theta)
+            dy = self.r * math.sin(theta)
+            rows.append(
+                np.stack(
+                    [
+                        self._simplex_grid([sx + dx], sy + dy)[0],
+                        self._simplex_grid([sx + 1 + dx], sy + dy)[0],
+                    ],
+                    axis=-1,
+                )
+            )
+        return np.array(rows).reshape(len(rows), len(sy), 2)
+
+    def points(self, i_indices, j_indices):
+        sy = np.asarray(j_indices, dtype=float) * self.jstep + self.jstart
+        # istart can be fractional, as in point().
+        steps = np.array([(self.istart + i) % self.isteps for i in i_indices], dtype=float)
+        if self.lattice_tolerance is not None and len(steps):
+            # One lattice node per step would be no cheaper than exact.
+            lattice = self._lattice(
+                j_indices,
+                lambda: NoiseLattice.fit(
+                    lambda us: self._circle_points(us, sy),
+                    self.lattice_tolerance, 0, 2, period=self.isteps,
+                ),
+            )
+            if lattice is not None:
+                return lattice(steps)
+        # Only isteps distinct lines exist: compute each one once.
+        unique, inverse = np.unique(steps, return_inverse=True)
+        return self._circle_points(unique, sy)[inverse.reshape(-1)]
+
+    def line_key(self, i):
+        return (self.istart + i) % self.isteps
+
+    @property
+    def line_period(self):
+        return self.isteps
+
+    def advanced(self, nlines):
+        return dataclasses.replace(self, istart=self.istart + nlines)
+
+
+def lod_select(ctrl_points, threshold):
+    """
+    Choose curves to draw, skipping ones that look like the last one drawn.
+
+    A curve is skipped if none of its control points are `threshold` or more
+    from the corresponding control point of the last kept curve.  Returns the
+    indices of the kept curves, and how many curves each kept curve stands
+    for, itself included.
+    """
+    flat = ctrl_points.reshape(len(ctrl_points), -1, 2)
+    kept = []
+    merged = []
+    last = None
+    threshold2 = threshold * threshold
+    for n, curve in enumerate(flat):
+        if last is not None and ((curve - last) ** 2).sum(axis=-1).max() < threshold2:
+            merged[-1] += 1
+            continue
+        kept.append(n)
+        merged.append(1)
+        last = curve
+    return np.array(kept, dtype=int), np.array(merged, dtype=int)
+
+
+def _visible(shapes, clip, pad):
+    """
+    Which shapes of an (nshapes, npoints, 2) array can touch `clip`?
+
+    Each shape lies inside the bounding box of its points grown by `pad`, as a
+    Bézier curve lies inside its control points.  `clip` is (x0, y0, x1, y1).
+    """
+    x0, y0, x1, y1 = clip
+    lo = shapes.min(axis=1) - pad
+    hi = shapes.max(axis=1) + pad
+    return (hi[:, 0] >= x0) & (lo[:, 0] <= x1) & (hi[:, 1] >= y0) & (lo[:, 1] <= y1)
+
 
 @dataclasses.dataclass
 class Fluidity:
@@ -159,39 +639,376 @@ class Fluidity:
     nlines: int = 100
     sorter: HilbertSorter | None = None
     curver: Callable = hobby_curve
+    # "numpy", or "numba" to use compiled kernels from numba_kernels.py.
+    engine: str = "numpy"
+    # Optional Stats to record the time and work of each stage.
+    stats: Stats | None = dataclasses.field(default=None, compare=False, repr=False)
+    # The dtype of the stored geometry: np.float32 halves its memory.
+    dtype: Any = np.float64
+    # Optional GeometryCache to reuse geometry computed before, even by
+    # other processes.
+    cache: GeometryCache | None = dataclasses.field(default=None, compare=False, repr=False)
+
+    # The fields that each stage's output depends on, besides the output of
+    # the stage before it.  Changing fields only recomputes from the first
+    # stage that depends on them.
+    STAGE_FIELDS = {
+        "noise": {"noise", "npoints", "engine"},
+        "sort": {"sorter"},
+        # The control points are kept only in the final dtype.
+        "curve": {"curver", "dtype"},
+    }
 
     def __post_init__(self):
-        lines = [
-            [self.noise.point(i, j) for j in range(self.npoints)]
-            for i in range(self.nlines)
-        ]
+        self._kernels = _engine_kernels(self.engine)
+        if self.cache is None:
+            self._set_computed(range(self.nlines))
+        else:
+            self._cached_geometry()
 
-        self.lines = []
-        self.curves = []
+    def _cache_key(self):
+        return cache_key(
+            noise=self.noise,
+            npoints=self.npoints,
+            nlines=self.nlines,
+            sorter=self.sorter,
+            curver=self.curver,
+            engine=self.engine,
+            dtype=np.dtype(self.dtype).str,
+        )
 
-        for line in lines:
-            if self.sorter is not None:
-                line = self.sorter(line)
-            self.lines.append(line)
-            self.curves.append(self.curver(line))
+    def _cached_geometry(self, compute=None):
+        """
+        Set the geometry from the cache, or compute it and cache it.
+
+        `compute` sets the geometry if it isn't in the cache, by default by
+        computing all the lines.
+        """
+        key = self._cache_key()
+        arrays = self.cache.get(key)
+        if arrays is not None:
+            count(self.stats, "cache hits")
+            self._set_geometry(arrays["points"], arrays["ctrl_points"])
+            if "sorted_indices" in arrays:
+                # Leave the sorter as computing the lines would have.
+                self.sorter.sorted_indices = arrays["sorted_indices"]
+            return
+
+        count(self.stats, "cache misses")
+        if compute is None:
+            self._set_computed(range(self.nlines))
+        else:
+            compute()
+        arrays = {"points": self.points, "ctrl_points": self.ctrl_points}
+        if getattr(self.sorter, "sorted_indices", None) is not None:
+            arrays["sorted_indices"] = self.sorter.sorted_indices
+        self.cache.put(key, **arrays)
+
+    def _set_geometry(self, points, ctrl_points, stages=None):
+        """
+        Store the geometry.
+
+        `points` is shaped (nlines, npoints, 2), and `ctrl_points` is shaped
+        (nlines, npoints, 4, 2): for each point, the Bezier segment from it
+        to the next point.  `stages` is the (grid, sorted points) that they
+        were computed from, at full precision, kept for `tweak` to reuse.
+        """
+        self.points = points
+        self.ctrl_points = ctrl_points
+        self._stages = stages
+        self._lines = None
+        self._curves = None
+        self._packed_dlists = None
+        # lod_select's results, by threshold.
+        self._lod_selections = {}
+
+    def _set_computed(self, indices):
+        grid, points, ctrl_points = self._compute_stages(indices)
+        self._set_geometry(*self._cast(points, ctrl_points), stages=(grid, points))
+
+    @property
+    def lines(self):
+        """The points as lists of [x, y] lists, one list per line."""
+        if self._lines is None:
+            self._lines = self.points.tolist()
+        return self._lines
+
+    @property
+    def curves(self):
+        """The curves as lists of [start, ctrl_a, ctrl_b, end] segments."""
+        if self._curves is None:
+            self._curves = self.ctrl_points.tolist()
+        return self._curves
+
+    def _noise_grid(self, indices):
+        """The unsorted points of noise lines `indices`."""
+        with stage(self.stats, "noise"):
+            if self._kernels is not None and self.noise.lattice_tolerance is None:
+                grid = self._kernels.noise_points(self.noise, indices, range(self.npoints))
+            else:
+                grid = self.noise.points(indices, range(self.npoints))
+        count(self.stats, "noise evaluations", 2 * grid.shape[0] * grid.shape[1])
+        return grid
+
+    def _sort_grid(self, grid):
+        """The lines of `grid`, each sorted by the sorter."""
+        with stage(self.stats, "sort"):
+            if self.sorter is None:
+                points = grid
+            elif hasattr(self.sorter, "sort_lines") and len(grid):
+                points = self.sorter.sort_lines(grid, self._kernels)
+            else:
+                points = np.array([self.sorter(line) for line in grid.tolist()], dtype=float)
+                points = points.reshape(grid.shape)
+        return points
+
+    def _curve_points(self, points):
+        """The control points of the curver's curves through sorted `points`."""
+        with stage(self.stats, "curve"):
+            batch = getattr(self.curver, "batch", None)
+            if batch is not None and len(points):
+                batch = _compiled(batch, self._kernels)
+                ctrl_points = batch(points)
+            else:
+                ctrl_points = np.array([self.curver(line) for line in points.tolist()], dtype=float)
+                ctrl_points = ctrl_points.reshape(points.shape[:2] + (4, 2))
+        # Each curver solves one linear system per line.
+        count(self.stats, "linear solves", len(points))
+        return ctrl_points
+
+    def _compute_stages(self, indices):
+        """The grid, sorted points and control points for noise lines `indices`."""
+        grid = self._noise_grid(indices)
+        points = self._sort_grid(grid)
+        return grid, points, self._curve_points(points)
+
+    def _cast(self, points, ctrl_points):
+        return (
+            points.astype(self.dtype, copy=False),
+            ctrl_points.astype(self.dtype, copy=False),
+        )
+
+    def _compute_lines(self, indices):
+        """Compute the sorted points and control points for noise lines `indices`."""
+        _, points, ctrl_points = self._compute_stages(indices)
+        return self._cast(points, ctrl_points)
 
     def tweak(self, **changes):
-        return dataclasses.replace(self, **changes)
+        """
+        A copy of this Fluidity with some fields changed.
+
+        Only the stages that depend on the changed fields are recomputed: a
+        new curver reuses the noise and sorted points, a new sorter reuses the
+        noise, and more lines only computes the new ones.
+        """
+        fields = {f.name for f in dataclasses.fields(self)}
+        unknown = changes.keys() - fields
+        if unknown:
+            raise TypeError(f"Unknown Fluidity fields: {', '.join(sorted(unknown))}")
+        changed = {name for name, value in changes.items() if getattr(self, name) != value}
+
+        new = copy.copy(self)
+        for name, value in changes.items():
+            setattr(new, name, value)
+        new._kernels = _engine_kernels(new.engine)
+        if new.cache is None:
+            new._tweak_geometry(self, changed)
+        else:
+            new._cached_geometry(lambda: new._tweak_geometry(self, changed))
+        return new
+
+    def _tweak_geometry(self, source, changed):
+        """Set the geometry, reusing what it can from `source`."""
+        if source._stages is None or changed & self.STAGE_FIELDS["noise"]:
+            self._set_computed(range(self.nlines))
+            return
+
+        keep = min(source.nlines, self.nlines)
+        grid, points = (a[:keep] for a in source._stages)
+        if changed & self.STAGE_FIELDS["sort"]:
+            points = self._sort_grid(grid)
+        if changed & (self.STAGE_FIELDS["sort"] | self.STAGE_FIELDS["curve"]):
+            ctrl_points = self._curve_points(points)
+            cast = self._cast(points, ctrl_points)
+        else:
+            cast = (source.points[:keep], source.ctrl_points[:keep])
+
+        if self.nlines > keep:
+            more = self._compute_stages(range(keep, self.nlines))
+            grid, points = (np.concatenate([a, m]) for a, m in zip((grid, points), more))
+            cast = tuple(np.concatenate([a, m]) for a, m in zip(cast, self._cast(*more[1:])))
+        self._set_geometry(*cast, stages=(grid, points))
+
+    def frames(self, nframes):
+        """
+        Yield `nframes` Fluidity objects for an animation.
+
+        Frame k is this Fluidity with its noise advanced k lines, so frame k's
+        line n is frame k-1's line n+1.  Lines are computed once and reused
+        from frame to frame, keyed by `Noise.line_key`.  The sorter must give
+        the same result each time it sees a line, as the Hilbert sorters do.
+        """
+        cache = {}
+        for n, key in enumerate(map(self.noise.line_key, range(self.nlines))):
+            cache[key] = (self.points[n], self.ctrl_points[n])
+
+        for k in range(nframes):
+            indices = range(k, k + self.nlines)
+            keys = [self.noise.line_key(i) for i in indices]
+            missing = {}
+            for i, key in zip(indices, keys):
+                if key not in cache:
+                    missing.setdefault(key, i)
+            if missing:
+                points, ctrl_points = self._compute_lines(list(missing.values()))
+                cache.update(zip(missing, zip(points, ctrl_points)))
+
+            frame = copy.copy(self)
+            frame.noise = self.noise.advanced(k)
+            if keys:
+                frame._set_geometry(
+                    np.stack([cache[key][0] for key in keys]),
+                    np.stack([cache[key][1] for key in keys]),
+                )
+            if self.noise.line_period is None:
+                # Lines never come back: keep only the ones still in use.
+                cache = {key: cache[key] for key in keys}
+            yield frame
 
     def draw(
         self,
         *,
-        format="svg",
+        format=None,
         size=(600, 600),
+        backend="cairo",
+        output=None,
+        precision=2,
+        band_height=None,
         **kwargs,
     ):
-        with cairo_context(*size, format=format) as context:
+        """
+        Draw to a new drawing, and return it.
+
+        `backend` is "cairo", "svg" to write SVG directly without cairo,
+        with `precision` decimal places in coordinates, or "density" for a
+        PNG from `draw_density`.  `output` is where to
+        write the drawing, or None to display it in Jupyter.  For the svg
+        backend it can also be a text stream.
+
+        With `band_height`, a PNG is rendered that many rows at a time, so
+        that huge prints need only a band's worth of pixel memory.
+
+        As with `cairo_context`, an output file name ending in .svg or .png
+        sets the format.  Otherwise it's "png" for the density backend, and
+        "svg" for the others.
+        """
+        format = output_format(format, output) or ("png" if backend == "density" else "svg")
+        if band_height is not None:
+            if backend != "cairo" or format != "png":
+                raise ValueError("band_height only applies to cairo PNG drawings")
+            return banded_png(
+                lambda context: self.draw_in_context(context, **kwargs),
+                size=size, output=output, band_height=band_height, stats=self.stats,
+            )
+        if backend == "svg":
+            if format != "svg":
+                raise ValueError(f"The svg backend can't write {format!r}")
+            with stage(self.stats, "encode"):
+                with SvgDrawing(*size, output=output, precision=precision) as drawing:
+                    self.draw_svg(drawing, **kwargs)
+            return drawing
+        if backend == "density":
+            if format != "png":
+                raise ValueError(f"The density backend can't write {format!r}")
+            return self.draw_density(size=size, output=output, **kwargs)
+        if backend != "cairo":
+            raise ValueError(f"Unknown backend: {backend!r}")
+        with cairo_context(*size, format=format, output=output, stats=self.stats) as context:
             self.draw_in_context(context, **kwargs)
         return context
 
-    def draw_in_context(
+    def animate_svg(
         self,
-        context,
+        nframes,
+        *,
+        size=(600, 600),
+        output=None,
+        precision=2,
+        frame_time=0.1,
+        iterations="infinite",
+        dedup=True,
+        **kwargs,
+    ):
+        """
+        Draw `nframes` of `frames` as an animated SVG, and return it.
+
+        With `dedup`, each curve shared between frames is formatted and
+        written once and referenced with <use>, so an animation is about as
+        large as its distinct curves.  The other arguments are as for `draw` and
+        `svgwriter.AnimatedSvg`, and `kwargs` go to `draw_svg`.
+        """
+        with stage(self.stats, "encode"):
+            with AnimatedSvg(
+                *size, output=output, precision=precision, frame_time=frame_time,
+                iterations=iterations, dedup=dedup,
+            ) as anim:
+                for frame in self.frames(nframes):
+                    # frames() computes each line key once, so equal keys are equal lines.
+                    line_keys = [frame.noise.line_key(n) for n in range(frame.nlines)]
+                    with anim.frame():
+                        frame.draw_svg(anim, line_keys=line_keys, **kwargs)
+        return anim
+
+    def _device_transform(self, size):
+        """The scale and offsets that draw_in_context maps -1..1 with."""
+        sizew, sizeh = size
+        scale = min(sizew / 2, sizeh / 2)
+        offset_x = (sizew - 2 * scale) / 2 + scale
+        offset_y = (sizeh - 2 * scale) / 2 + scale
+        return scale, offset_x, offset_y
+
+    def draw_density(
+        self,
+        *,
+        size=(600, 600),
+        output=None,
+        curve_color=(0, 0, 0, 1),
+        curve_width=0.25,
+        tone="alpha",
+        exposure=1.0,
+        gamma=1.0,
+    ):
+        """
+        Draw the curves by accumulating their density, and return a PIL image.
+
+        Much faster than cairo for many translucent curves, and without 8-bit
+        banding where they pile up.  `tone`, `exposure` and `gamma` choose how
+        density becomes color, as in `density.tone_map`: the default "alpha"
+        looks like cairo strokes of curve_color's alpha.  The image is saved
+        as a PNG to `output` if given.
+
+        Without numba, the curves are splatted with numpy, which takes
+        minutes for 100k lines.
+        """
+        *rgb, alpha = (tuple(curve_color) + (1,))[:4]
+        scale, offset_x, offset_y = self._device_transform(size)
+        with stage(self.stats, "draw"):
+            buffer = density.accumulate(
+                self.ctrl_points, size, scale=scale, offset=(offset_x, offset_y),
+                # Compiled splatting gives the same pixels much faster, so
+                # it's used whenever numba is available, whatever the engine.
+                width=curve_width, kernels=numba_kernels,
+            )
+            coverage = density.tone_map(buffer, tone, alpha=alpha, exposure=exposure, gamma=gamma)
+            image = density.to_image(coverage, rgb)
+        if output is not None:
+            with stage(self.stats, "encode"):
+                image.save(os.path.expandvars(os.path.expanduser(output)), format="PNG")
+        return image
+
+    def draw_svg(
+        self,
+        drawing,
         *,
         curve_color=(0, 0, 0, 1),
         curve_width=0.25,
@@ -200,39 +1017,191 @@ class Fluidity:
         line_color=None,
         line_width=0.25,
         point_colors=None,
+        line_keys=None,
     ):
-        sizew, sizeh = context.size()
-        scale_x = sizew / 2
-        scale_y = sizeh / 2
-        scale = min(scale_x, scale_y)
-        offset_x = (sizew - 2 * scale) / 2 + scale
-        offset_y = (sizeh - 2 * scale) / 2 + scale
-        context.translate(offset_x, offset_y)
-        context.scale(scale, scale)
-        context.rectangle(-1, -1, 2, 2)
-        context.set_source_rgb(1, 1, 1)
-        context.fill()
+        """
+        Like `draw_in_context`, but writing to an SvgDrawing.
+
+        `line_keys` are keys for the lines, equal for lines with equal
+        geometry, as from `Noise.line_key` across `frames`.  With them, an
+        AnimatedSvg formats each line only the first time it's drawn.
+        """
+        scale, offset_x, offset_y = self._device_transform(drawing.size())
+        offset = np.array([offset_x, offset_y])
+        drawing.rect(offset_x - scale, offset_y - scale, 2 * scale, 2 * scale, svg_color("fill", (1, 1, 1)))
+        # cairo's default miter limit is 10, SVG's is 4.
+        stroke_attrs = 'fill="none" stroke-miterlimit="10" stroke-width="{:g}" {}'
+
+        def write_paths(kind, make_ds):
+            if line_keys is None:
+                drawing.paths(make_ds(slice(None)))
+            else:
+                drawing.keyed_paths([(kind, key) for key in line_keys], make_ds)
 
         if line_color:
-            context.set_source_rgba(*line_color)
-            context.set_line_width(line_width / scale)
-            for line in self.lines:
-                draw_lines(context, line, closed=True)
+            drawing.begin_group(stroke_attrs.format(line_width, svg_color("stroke", line_color)))
+            write_paths(
+                "line", lambda lines: drawing.polyline_ds(self.points[lines] * scale + offset, closed=True)
+            )
+            drawing.end_group()
 
         if curve_color:
-            context.set_source_rgba(*curve_color)
-            context.set_line_width(curve_width / scale)
-            draw_dlists(context, self.dlists())
+            drawing.begin_group(stroke_attrs.format(curve_width, svg_color("stroke", curve_color)))
+            write_paths("curve", lambda lines: drawing.curve_ds(self.ctrl_points[lines] * scale + offset))
+            drawing.end_group()
 
         if point_color or point_colors:
             if point_color:
                 assert point_colors is None
                 point_colors = [point_color] * self.npoints
-            for line in self.lines:
-                for pt, point_color in zip(line, point_colors):
-                    context.set_source_rgba(*point_color)
-                    context.circle(*pt, point_size / scale)
-                    context.fill()
+            ncolors = min(self.npoints, len(point_colors))
+            points = (self.points[:, :ncolors] * scale + offset).reshape(-1, 2)
+            colors = [tuple(point_colors[k % ncolors]) for k in range(len(points))]
+            # As with context.circles: points in order, a group for each run of one color.
+            start = 0
+            for color, run in itertools.groupby(colors):
+                end = start + len(list(run))
+                drawing.begin_group(svg_color("fill", color))
+                drawing.circles(points[start:end, 0], points[start:end, 1], point_size)
+                drawing.end_group()
+                start = end
+
+    def draw_in_context(
+        self,
+        context,
+        *,
+        curve_color=(0, 0, 0, 1),
+        curve_width=0.25,
+        point_color=None,
+        point_size=1,
+        line_color=None,
+        line_width=0.25,
+        point_colors=None,
+        lod=None,
+        lod_alpha=False,
+    ):
+        """
+        Draw the lines, curves, and points on a cairo context.
+
+        `lod` turns on level-of-detail culling: a curve that is within `lod`
+        pixels of the last drawn curve at every control point isn't drawn.
+        With `lod_alpha`, a drawn curve's alpha is raised to look like the
+        curves it stands for drawn on top of each other.  The choice of
+        curves is kept, so drawing again at the same scale, as for each band
+        of a banded PNG, doesn't choose again.
+
+        Returns the number of curves culled, which is also counted in the
+        stats as "lod culled".
+        """
+        culled = 0
+        with stage(self.stats, "draw"):
+            scale, offset_x, offset_y = self._device_transform(context.size())
+            context.translate(offset_x, offset_y)
+            context.scale(scale, scale)
+            context.rectangle(-1, -1, 2, 2)
+            context.set_source_rgb(1, 1, 1)
+            context.fill()
+
+            # Skip shapes that can't touch the clip region, as when drawing
+            # one band of a banded PNG.  Pad by the widest a stroke can
+            # reach: a mitered corner, plus a pixel of antialiasing.
+            clip = context.clip_extents()
+            miter = context.get_miter_limit()
+
+            if line_color:
+                context.set_source_rgba(*line_color)
+                context.set_line_width(line_width / scale)
+                visible = _visible(self.points, clip, (line_width * miter / 2 + 1) / scale)
+                context.polylines(self.points[visible], closed=True)
+                # move_to, line_to for the rest, close_path, stroke.
+                count(self.stats, "path ops", np.count_nonzero(visible) * (self.npoints + 2))
+
+            if curve_color:
+                context.set_source_rgba(*curve_color)
+                context.set_line_width(curve_width / scale)
+                ctrl_points = self.ctrl_points
+                merged = np.ones(len(ctrl_points), dtype=int)
+                if lod:
+                    # Choose from all the curves, not just the visible ones, so
+                    # that bands and tiles agree about what's drawn.
+                    kept, merged = self._lod_select(lod / scale)
+                    culled = len(ctrl_points) - len(kept)
+                    count(self.stats, "lod culled", culled)
+                    ctrl_points = ctrl_points[kept]
+                visible = _visible(
+                    ctrl_points.reshape(len(ctrl_points), -1, 2), clip, (curve_width * miter / 2 + 1) / scale
+                )
+                if lod_alpha and lod:
+                    # One source for each number of merged curves.  The curves
+                    # are all one color, so drawing order doesn't matter.
+                    *rgb, alpha = (tuple(curve_color) + (1,))[:4]
+                    for nmerged in np.unique(merged[visible]).tolist():
+                        context.set_source_rgba(*rgb, 1 - (1 - alpha) ** nmerged)
+                        dlists = PackedDlists.from_ctrl_points(ctrl_points[visible & (merged == nmerged)])
+                        draw_dlists(context, dlists)
+                        count(self.stats, "path ops", len(dlists))
+                else:
+                    if visible.all() and not lod:
+                        dlists = self.packed_dlists()
+                    else:
+                        dlists = PackedDlists.from_ctrl_points(ctrl_points[visible])
+                    draw_dlists(context, dlists)
+                    count(self.stats, "path ops", len(dlists))
+
+            if point_color or point_colors:
+                if point_color:
+                    assert point_colors is None
+                    point_colors = [point_color] * self.npoints
+                ncolors = min(self.npoints, len(point_colors))
+                points = self.points[:, :ncolors].reshape(-1, 2)
+                visible = np.flatnonzero(_visible(points[:, None], clip, (point_size + 1) / scale))
+                context.circles(
+                    points[visible, 0],
+                    points[visible, 1],
+                    point_size / scale,
+                    [point_colors[k % ncolors] for k in visible.tolist()],
+                )
+                count(self.stats, "path ops", 2 * len(visible))
+        return culled
+
+    def _lod_select(self, threshold):
+        """`lod_select` of the curves, computed once for each threshold."""
+        if threshold not in self._lod_selections:
+            self._lod_selections[threshold] = lod_select(self.ctrl_points, threshold)
+        return self._lod_selections[threshold]
 
     def dlists(self):
         return [curve_dlist(c) for c in self.curves]
+
+    def packed_dlists(self):
+        """The curves' display lists as a PackedDlists, built once."""
+        if self._packed_dlists is None:
+            self._packed_dlists = PackedDlists.from_ctrl_points(self.ctrl_points)
+        return self._packed_dlists
+
+
+@dataclasses.dataclass
+class Tile:
+    """One tile of a grid for `draw_tiles`: Fluidity's arguments, and draw_in_context's."""
+    params: dict
+    draw: dict = dataclasses.field(default_factory=dict)
+
+
+def _draw_tile(tile, context):
+    Fluidity(**tile.params).draw_in_context(context, **tile.draw)
+
+
+def draw_tiles(context, tiles, *, rows, cols, workers=None):
+    """
+    Draw a grid of Fluidity tiles on `context`, in parallel worker processes.
+
+    The result is the same as making each tile's Fluidity and drawing it in
+    the tiles of `context_tiles(context, rows=rows, cols=cols)`, but the
+    tiles are built and drawn on all the CPUs.  See `drawing.render_tiles`.
+    """
+    render_tiles(context, _draw_tile, tiles, rows=rows, cols=cols, workers=workers)
+
+
+if __name__ == "__main__":
+    from batch import main
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""A persistent on-disk cache of computed Fluidity geometry."""
+
+import dataclasses
+import hashlib
+import json
+import os
+import secrets
+import time
+import zipfile
+
+import numpy as np
+
+
+# Change this when the computed geometry changes, to ignore old entries.
+CACHE_VERSION = 1
+
+# Temporary files older than this were left by a killed writer.
+STALE_SECONDS = 3600
+
+
+def make_temp_file(directory, prefix, suffix):
+    """
+    Create a new file for writing in `directory`, and return (fd, path).
+
+    Like tempfile.mkstemp, but the file gets the usual permissions from the
+    umask, not 0600, so other users can read what it becomes.
+    """
+    while True:
+        path = os.path.join(directory, f"{prefix}{secrets.token_hex(8)}{suffix}")
+        try:
+            return os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666), path
+        except FileExistsError:
+            continue
+
+
+def _describe(obj):
+    """A JSON-able description of a noise, sorter or curver, for hashing."""
+    if obj is None or isinstance(obj, (bool, int, float, str)):
+        return obj
+    if isinstance(obj, (list, tuple)):
+        return [_describe(o) for o in obj]
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, type) or callable(obj) and hasattr(obj, "__qualname__"):
+        name = f"{obj.__module__}.{obj.__qualname__}"
+        if "<" in name:
+            # Lambdas and nested functions can't be identified by name.
+            raise ValueError(f"Can't make a cache key for {name}")
+        return name
+    if dataclasses.is_dataclass(obj):
+        fields = {f.name: _describe(getattr(obj, f.name)) for f in dataclasses.fields(obj)}
+    else:
+        fields = {name: _describe(value) for name, value in vars(obj).items()}
+    return {"class": _describe(type(obj)), **fields}
+
+
+def cache_key(**parts):
+    """A stable hash of `parts`: noise, npoints, and so on."""
+    data = json.dumps(
+        {"version": CACHE_VERSION, **{name: _describe(v) for name, v in parts.items()}},
+        sort_keys=True,
+    )
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+class GeometryCache:
+    """
+    A directory of computed geometry, as .npz files named by key.
+
+    Pass one to `Fluidity(cache=...)`.  Entries are written to temporary files
+    and renamed into place, so any number of processes can share a cache
+    directory.  When the directory grows past `max_bytes`, the least recently
+    used entries are deleted.
+
+    Arguments:
+        directory (str): where to keep the files.  It's created if needed.
+        max_bytes (int): the most the cache should hold.
+    """
+
+    def __init__(self, directory="~/.cache/fluidity", max_bytes=1_000_000_000):
+        self.directory = os.path.expandvars(os.path.expanduser(directory))
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def get(self, key):
+        """The dict of arrays stored under `key`, or None."""
+        path = self._path(key)
+        try:
+            with np.load(path) as npz:
+                arrays = dict(npz)
+            # The modification time is the last use, for LRU eviction.
+            os.utime(path)
+        except (OSError, ValueError, zipfile.BadZipFile):
+            # Missing, evicted by another process, or unreadable.
+            return None
+        return arrays
+
+    def put(self, key, **arrays):
+        """Store `arrays` under `key`, then evict to stay under max_bytes."""
+        fd, temp = make_temp_file(self.directory, ".", ".npz")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(temp, self._path(key))
+        except BaseException:
+            os.remove(temp)
+            raise
+        self.evict()
+
+    def evict(self):
+        """
+        Delete least recently used entries until under max_bytes.
+
+        Temporary files left by killed writers are deleted too.
+        """
+        entries = []
+        stale = time.time() - STALE_SECONDS
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith(".npz"):
+                    continue
+                try:
+                    stat = entry.stat()
+                    if entry.name.startswith("."):
+                        if stat.st_mtime < stale:
+                            os.remove(entry.path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Another process evicted it first.
+                pass
+            total -= size
+
+    def clear(self):
+        """Delete every entry."""
+        for name in os.listdir(self.directory):
+            if name.endswith(".npz") and not name.startswith("."):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
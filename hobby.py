@@ -112,13 +112,11 @@ class HobbyCurve:
             D[i] = z_j.beta / (z_i.alpha ** 2 * z_i.d_val)
             R[i] = -B[i] * z_i.psi - D[i] * z_j.psi
 
-        # Set up matrix M such that the soln. Mx = R are the theta values.
-        M = np.zeros((self.num_points, self.num_points))
-        for i in range(self.num_points):
-            # Fill i-th row of M
-            M[i][i - 1] = A[i]
-            M[i][i] = B[i] + C[i]
-            M[i][(i + 1) % self.num_points] = D[i]
+        # M such that the soln. Mx = R are the theta values is tridiagonal,
+        # plus two corner entries for cyclic paths. Keep just its diagonals.
+        lower = A  # M[i][i - 1], with M[0][-1] in lower[0].
+        diag = B + C  # M[i][i]
+        upper = D  # M[i][i + 1], with M[-1][0] in upper[-1].
 
         # Special formulas for first and last rows of M with non-cyclic paths.
         if not self.is_cyclic:
@@ -126,19 +124,30 @@ class HobbyCurve:
             alpha_0 = self.points[0].alpha
             beta_1 = self.points[1].beta
             xi_0 = (alpha_0 ** 2 * self.begin_curl) / beta_1 ** 2
-            M[0][0] = alpha_0 * xi_0 + 3 - beta_1
-            M[0][1] = (3 - alpha_0) * xi_0 + beta_1
+            diag[0] = alpha_0 * xi_0 + 3 - beta_1
+            upper[0] = (3 - alpha_0) * xi_0 + beta_1
             R[0] = -((3 - alpha_0) * xi_0 + beta_1) * self.points[1].psi
             # Last row of M
             alpha_n_1 = self.points[-2].alpha
             beta_n = self.points[-1].beta
             xi_n = (beta_n ** 2 * self.end_curl) / alpha_n_1 ** 2
-            M[-1][-2] = (3 - beta_n) * xi_n + alpha_n_1
-            M[-1][-1] = (beta_n * xi_n + 3 - alpha_n_1)
+            lower[-1] = (3 - beta_n) * xi_n + alpha_n_1
+            diag[-1] = (beta_n * xi_n + 3 - alpha_n_1)
             R[-1] = 0
 
         # Solve for theta values.
-        thetas = np.linalg.solve(M, R)
+        if self.num_points < 3:
+            # Too small for the diagonals to be distinct: solve it densely.
+            M = np.zeros((self.num_points, self.num_points))
+            for i in range(self.num_points):
+                M[i][i - 1] = lower[i]
+                M[i][i] = diag[i]
+                M[i][(i + 1) % self.num_points] = upper[i]
+            thetas = np.linalg.solve(M, R)
+        elif self.is_cyclic:
+            thetas = solve_cyclic_tridiagonal(lower, diag, upper, R)
+        else:
+            thetas = solve_tridiagonal(lower, diag, upper, R)
         for i, point in enumerate(self.points):
             point.theta = thetas[i]
 
@@ -210,3 +219,100 @@ def velocity(theta: float, phi: float) -> float:
             np.cos(theta) - np.cos(phi))
     denominator = (1 + (1 / 2) * (np.sqrt(5) - 1) * np.cos(theta) + (1 / 2) * (3 - np.sqrt(5)) * np.cos(phi))
     return numerator / denominator
+
+
+def solve_tridiagonal(lower: np.ndarray, diag: np.ndarray, upper: np.ndarray, rhs: np.ndarray) -> np.ndarray:
+    """Solve a tridiagonal system in O(n) with the Thomas algorithm.
+
+    Row i is lower[i] * x[i-1] + diag[i] * x[i] + upper[i] * x[i+1] = rhs[i];
+    lower[0] and upper[-1] are ignored.  Leading axes are independent systems
+    that are all solved together.
+    """
+    # Iterate over the last axis.  Plain floats are much faster than numpy
+    # scalars for a single system; batches step through whole columns.
+    lower, diag, upper, rhs = [_by_position(np.asarray(v, dtype=float)) for v in (lower, diag, upper, rhs)]
+    n = len(diag)
+    c_prime = [upper[0] / diag[0]]
+    d_prime = [rhs[0] / diag[0]]
+    for i in range(1, n):
+        denom = diag[i] - lower[i] * c_prime[i - 1]
+        c_prime.append(upper[i] / denom)
+        d_prime.append((rhs[i] - lower[i] * d_prime[i - 1]) / denom)
+    x = d_prime
+    for i in range(n - 2, -1, -1):
+        x[i] = x[i] - c_prime[i] * x[i + 1]
+    return np.moveaxis(np.array(x), 0, -1)
+
+
+def _by_position(values: np.ndarray) -> list:
+    """Split an array into a list along its last axis."""
+    if values.ndim == 1:
+        return values.tolist()
+    return list(np.moveaxis(values, -1, 0))
+
+
+def solve_cyclic_tridiagonal(lower: np.ndarray, diag: np.ndarray, upper: np.ndarray, rhs: np.ndarray) -> np.ndarray:
+    """Solve a cyclic tridiagonal system in O(n), using Sherman-Morrison.
+
+    Like `solve_tridiagonal`, but lower[0] is the corner entry M[0][-1] and
+    upper[-1] is the corner entry M[-1][0].
+    """
+    top_right = lower[..., 0]
+    bottom_left = upper[..., -1]
+    gamma = -diag[..., 0]
+    diag = diag.copy()
+    diag[..., 0] -= gamma
+    diag[..., -1] -= bottom_left * top_right / gamma
+    x = solve_tridiagonal(lower, diag, upper, rhs)
+    u = np.zeros(np.shape(diag))
+    u[..., 0] = gamma
+    u[..., -1] = bottom_left
+    z = solve_tridiagonal(lower, diag, upper, u)
+    fact = (x[..., 0] + top_right * x[..., -1] / gamma) / (1 + z[..., 0] + top_right * z[..., -1] / gamma)
+    return x - fact[..., np.newaxis] * z
+
+
+def cyclic_hobby_curves(points: np.ndarray, tension: float = 1) -> np.ndarray:
+    """Calculates cyclic Hobby curves for many point lists at once.
+
+    `points` is shaped (..., num_points, 2).  The result is shaped
+    (..., num_points, 4, 2): for each point, the Bezier segment from it to the
+    next point, as (start, control a, control b, end).  This is the same
+    computation as `HobbyCurve(..., cyclic=True)`, done with whole-array math.
+    """
+    points = np.asarray(points, dtype=float)
+    z = points[..., 0] + 1j * points[..., 1]
+    num_points = z.shape[-1]
+    alpha = beta = 1 / tension
+
+    z_j = np.roll(z, -1, axis=-1)
+    delta = z_j - z  # From each point to the next.
+    d_vals = np.abs(delta)
+    if not np.all(d_vals):
+        raise ZeroDivisionError("Consecutive points are equal, causing zero division.")
+    d_h = np.roll(d_vals, 1, axis=-1)
+    psi = np.angle(delta / np.roll(delta, 1, axis=-1))
+
+    # Diagonals of the cyclic system, in Knuth's notation as in calculate_theta_vals.
+    A = alpha / (beta ** 2 * d_h)
+    B = (3 - alpha) / (beta ** 2 * d_h)
+    C = (3 - beta) / (alpha ** 2 * d_vals)
+    D = beta / (alpha ** 2 * d_vals)
+    R = -B * psi - D * np.roll(psi, -1, axis=-1)
+    if num_points < 3:
+        M = np.zeros(z.shape + (num_points,))
+        for i in range(num_points):
+            M[..., i, i - 1] = A[..., i]
+            M[..., i, i] = B[..., i] + C[..., i]
+            M[..., i, (i + 1) % num_points] = D[..., i]
+        theta = np.linalg.solve(M, R[..., np.newaxis])[..., 0]
+    else:
+        theta = solve_cyclic_tridiagonal(A, B + C, D, R)
+    phi_j = np.roll(-(psi + theta), -1, axis=-1)
+
+    rho = alpha * velocity(theta, phi_j)
+    sigma = beta * velocity(phi_j, theta)
+    ctrl_a = z + (1 / 3) * rho * np.exp(1j * theta) * delta
+    ctrl_b = z_j - (1 / 3) * sigma * np.exp(-1j * phi_j) * delta
+    segments = np.stack([z, ctrl_a, ctrl_b, z_j], axis=-1)
+    return np.stack([segments.real, segments.imag], axis=-1)
@@ -0,0 +1,294 @@
+"""
+Numba-compiled versions of Fluidity's numeric hot spots.
+
+Used by `Fluidity(engine="numba")`.  Importing this module raises ImportError
+if numba isn't installed.  Functions here have the same names and results as
+the numpy versions they replace in fluidity.py.  Compiled code is cached on
+disk, so the compile cost is paid once per machine, not once per process.
+"""
+
+import math
+
+import numba
+import numpy as np
+import super_simplex
+
+import cubic_spline
+import hobby
+
+
+@numba.njit(cache=True, parallel=True)
+def _simplex_points(xs, ys, perm):
+    values = np.empty(xs.size)
+    for k in numba.prange(xs.size):
+        values[k] = super_simplex.noise_2d(xs[k], ys[k], perm)
+    return values
+
+
+def noise_points(noise, i_indices, j_indices):
+    """Compute `noise.points(i_indices, j_indices)` with a compiled kernel."""
+    x0, x1, y = noise._sample_coords(i_indices, j_indices)
+    gen = noise.gen_simplex
+    # Gener.noise_2d offsets single-octave coordinates like this.
+    dx, dy = super_simplex.random_1f2(0, gen.seeds[0])
+    ys = (y + dy).ravel()
+    channels = [
+        _simplex_points((x + dx).ravel(), ys, gen.perms[0]).reshape(y.shape)
+        for x in (x0, x1)
+    ]
+    return np.stack(channels, axis=-1)
+
+
+@numba.njit(cache=True)
+def _interleave(x, y, bits):
+    key = 0
+    for b in range(bits):
+        key |= ((x >> b) & 1) << (2 * b + 1)
+        key |= ((y >> b) & 1) << (2 * b)
+    return key
+
+
+@numba.njit(cache=True)
+def _hilbert_keys(xs, ys, bits):
+    keys = np.empty(xs.size, dtype=np.int64)
+    for k in range(xs.size):
+        x = xs[k]
+        y = ys[k]
+        q = 1 << (bits - 1)
+        while q > 1:
+            p = q - 1
+            if x & q:
+                x ^= p
+            if y & q:
+                x ^= p
+            else:
+                t = (x ^ y) & p
+                x ^= t
+                y ^= t
+            q >>= 1
+        y ^= x
+        t = 0
+        q = 1 << (bits - 1)
+        while q > 1:
+            if y & q:
+                t ^= q - 1
+            q >>= 1
+        keys[k] = _interleave(x ^ t, y ^ t, bits)
+    return keys
+
+
+@numba.njit(cache=True)
+def _morton_keys(xs, ys, bits):
+    keys = np.empty(xs.size, dtype=np.int64)
+    for k in range(xs.size):
+        keys[k] = _interleave(xs[k], ys[k], bits)
+    return keys
+
+
+def hilbert_keys(coords, bits):
+    coords = np.asarray(coords, dtype=np.int64)
+    xs = np.ascontiguousarray(coords[..., 0]).ravel()
+    ys = np.ascontiguousarray(coords[..., 1]).ravel()
+    return _hilbert_keys(xs, ys, bits).reshape(coords.shape[:-1])
+
+
+def morton_keys(coords, bits):
+    coords = np.asarray(coords, dtype=np.int64)
+    xs = np.ascontiguousarray(coords[..., 0]).ravel()
+    ys = np.ascontiguousarray(coords[..., 1]).ravel()
+    return _morton_keys(xs, ys, bits).reshape(coords.shape[:-1])
+
+
+@numba.njit(cache=True)
+def solve_cyclic_tridiagonal(lower, diag, upper, rhs):
+    """Like hobby.solve_cyclic_tridiagonal, for a single system."""
+    n = diag.size
+    top_right = lower[0]
+    bottom_left = upper[n - 1]
+    gamma = -diag[0]
+    bb = diag.copy()
+    bb[0] -= gamma
+    bb[n - 1] -= bottom_left * top_right / gamma
+    u = np.zeros(n)
+    u[0] = gamma
+    u[n - 1] = bottom_left
+
+    # Thomas algorithm for both right-hand sides at once.
+    c_prime = np.empty(n)
+    x = np.empty(n)
+    z = np.empty(n)
+    c_prime[0] = upper[0] / bb[0]
+    x[0] = rhs[0] / bb[0]
+    z[0] = u[0] / bb[0]
+    for i in range(1, n):
+        denom = bb[i] - lower[i] * c_prime[i - 1]
+        c_prime[i] = upper[i] / denom
+        x[i] = (rhs[i] - lower[i] * x[i - 1]) / denom
+        z[i] = (u[i] - lower[i] * z[i - 1]) / denom
+    for i in range(n - 2, -1, -1):
+        x[i] -= c_prime[i] * x[i + 1]
+        z[i] -= c_prime[i] * z[i + 1]
+
+    fact = (x[0] + top_right * x[n - 1] / gamma) / (1 + z[0] + top_right * z[n - 1] / gamma)
+    return x - fact * z
+
+
+@numba.njit(cache=True)
+def _velocity(theta, phi):
+    numerator = 2 + math.sqrt(2) * (math.sin(theta) - (1 / 16) * math.sin(phi)) * (
+        math.sin(phi) - (1 / 16) * math.sin(theta)
+    ) * (math.cos(theta) - math.cos(phi))
+    denominator = (
+        1
+        + (1 / 2) * (math.sqrt(5) - 1) * math.cos(theta)
+        + (1 / 2) * (3 - math.sqrt(5)) * math.cos(phi)
+    )
+    return numerator / denominator
+
+
+@numba.njit(cache=True, parallel=True)
+def _cyclic_hobby_curves(points, tension):
+    nlines, n = points.shape[0], points.shape[1]
+    alpha = beta = 1 / tension
+    result = np.empty((nlines, n, 4, 2))
+    for line in numba.prange(nlines):
+        z = np.empty(n, dtype=np.complex128)
+        for i in range(n):
+            z[i] = complex(points[line, i, 0], points[line, i, 1])
+        delta = np.empty(n, dtype=np.complex128)
+        d_vals = np.empty(n)
+        for i in range(n):
+            delta[i] = z[(i + 1) % n] - z[i]
+            d_vals[i] = abs(delta[i])
+        psi = np.empty(n)
+        for i in range(n):
+            turn = delta[i] / delta[i - 1]
+            psi[i] = math.atan2(turn.imag, turn.real)
+
+        lower = np.empty(n)
+        diag = np.empty(n)
+        upper = np.empty(n)
+        rhs = np.empty(n)
+        for i in range(n):
+            d_h = d_vals[i - 1]
+            A = alpha / (beta ** 2 * d_h)
+            B = (3 - alpha) / (beta ** 2 * d_h)
+            C = (3 - beta) / (alpha ** 2 * d_vals[i])
+            D = beta / (alpha ** 2 * d_vals[i])
+            lower[i] = A
+            diag[i] = B + C
+            upper[i] = D
+            rhs[i] = -B * psi[i] - D * psi[(i + 1) % n]
+        theta = solve_cyclic_tridiagonal(lower, diag, upper, rhs)
+
+        for i in range(n):
+            j = (i + 1) % n
+            phi_j = -(psi[j] + theta[j])
+            rho = alpha * _velocity(theta[i], phi_j)
+            sigma = beta * _velocity(phi_j, theta[i])
+            ctrl_a = z[i] + (1 / 3) * rho * complex(math.cos(theta[i]), math.sin(theta[i])) * delta[i]
+            ctrl_b = z[j] - (1 / 3) * sigma * complex(math.cos(phi_j), -math.sin(phi_j)) * delta[i]
+            for k, pt in enumerate((z[i], ctrl_a, ctrl_b, z[j])):
+                result[line, i, k, 0] = pt.real
+                result[line, i, k, 1] = pt.imag
+    return result
+
+
+def hobby_curves(lines):
+    """Compiled version of fluidity.hobby_curves."""
+    points = np.ascontiguousarray(lines, dtype=float)
+    if points.shape[-2] < 3 or not np.all(np.diff(points, axis=-2, append=points[..., :1, :]).any(axis=-1)):
+        # Tiny systems need the dense solve, and repeated points need the
+        # numpy version's error: leave both to it.
+        return hobby.cyclic_hobby_curves(points)
+    return _cyclic_hobby_curves(points, 1.0)
+
+
+@numba.njit(cache=True, parallel=True)
+def _closed_cubic_curves(points):
+    nlines, n = points.shape[0], points.shape[1]
+    result = np.empty((nlines, n, 4, 2))
+    ones = np.ones(n)
+    fours = 4 * ones
+    for line in numba.prange(nlines):
+        b_points = np.empty((n, 2))
+        for c in range(2):
+            b_points[:, c] = solve_cyclic_tridiagonal(ones, fours, ones, 6 * points[line, :, c])
+        for i in range(n):
+            j = (i + 1) % n
+            h = i - 1 if i > 0 else n - 1
+            for c in range(2):
+                ctrl_a = (2 * b_points[i, c] + b_points[j, c]) / 3
+                ctrl_b = (b_points[i, c] + 2 * b_points[j, c]) / 3
+                prev_b = (b_points[h, c] + 2 * b_points[i, c]) / 3
+                next_a = (2 * b_points[j, c] + b_points[(j + 1) % n, c]) / 3
+                result[line, i, 0, c] = (prev_b + ctrl_a) / 2
+                result[line, i, 1, c] = ctrl_a
+                result[line, i, 2, c] = ctrl_b
+                result[line, i, 3, c] = (ctrl_b + next_a) / 2
+    return result
+
+
+def cubic_curves(lines):
+    """Compiled version of fluidity.cubic_curves."""
+    points = np.ascontiguousarray(lines, dtype=float)
+    if points.shape[-2] < 3:
+        return cubic_spline.closed_cubic_curves(points)
+    return _closed_cubic_curves(points)
+
+
+@numba.njit(cache=True, parallel=True)
+def _splat_segments(segments, nsamples, width, sizew, sizeh, nbuffers):
+    buffers = np.zeros((nbuffers, sizeh * sizew), dtype=np.float32)
+    nseg = segments.shape[0]
+    for b in numba.prange(nbuffers):
+        buffer = buffers[b]
+        for s in range(b * nseg // nbuffers, (b + 1) * nseg // nbuffers):
+            n = nsamples[s]
+            for k in range(n):
+                t = (k + 0.5) / n
+                mt = 1 - t
+                c0 = mt * mt * mt
+                c1 = 3 * mt * mt * t
+                c2 = 3 * mt * t * t
+                c3 = t * t * t
+                x = c0 * segments[s, 0, 0] + c1 * segments[s, 1, 0] + c2 * segments[s, 2, 0] + c3 * segments[s, 3, 0]
+                y = c0 * segments[s, 0, 1] + c1 * segments[s, 1, 1] + c2 * segments[s, 2, 1] + c3 * segments[s, 3, 1]
+                d0 = 3 * mt * mt
+                d1 = 6 * mt * t
+                d2 = 3 * t * t
+                vx = d0 * (segments[s, 1, 0] - segments[s, 0, 0]) + d1 * (segments[s, 2, 0] - segments[s, 1, 0]) + d2 * (segments[s, 3, 0] - segments[s, 2, 0])
+                vy = d0 * (segments[s, 1, 1] - segments[s, 0, 1]) + d1 * (segments[s, 2, 1] - segments[s, 1, 1]) + d2 * (segments[s, 3, 1] - segments[s, 2, 1])
+                weight = math.sqrt(vx * vx + vy * vy) * width / n
+                x -= 0.5
+                y -= 0.5
+                ix = math.floor(x)
+                iy = math.floor(y)
+                fx = x - ix
+                fy = y - iy
+                for dy in range(2):
+                    py = iy + dy
+                    if py < 0 or py >= sizeh:
+                        continue
+                    wy = fy if dy else 1 - fy
+                    for dx in range(2):
+                        px = ix + dx
+                        if px < 0 or px >= sizew:
+                            continue
+                        wx = fx if dx else 1 - fx
+                        buffer[py * sizew + px] += weight * wx * wy
+    density = np.zeros(sizeh * sizew, dtype=np.float32)
+    for b in range(nbuffers):
+        density += buffers[b]
+    return density
+
+
+def splat_segments(segments, nsamples, width, sizew, sizeh):
+    """Compiled version of density.splat_segments."""
+    # One buffer per thread, but no more than about 256MB of them.
+    nbuffers = max(1, min(numba.get_num_threads(), 2**26 // (sizew * sizeh)))
+    return _splat_segments(
+        np.ascontiguousarray(segments, dtype=np.float64),
+        np.ascontiguousarray(nsamples, dtype=np.int64),
+        float(width), sizew, sizeh, nbuffers,
+    )
@@ -28,6 +28,22 @@ def draw_dlists(dlists):
         draw_dlist(dlist)
         drawPath()
 
+def draw_packed_dlists(packed):
+    newPath()
+    for op, args in packed.commands():
+        match op, args:
+            case "move_to", [x, y]:
+                moveTo((x, y))
+            case "line_to", [x, y]:
+                lineTo((x, y))
+            case "curve_to", [a, b, c, d, e, f]:
+                curveTo((a, b), (c, d), (e, f))
+            case "close_path", []:
+                closePath()
+            case "stroke", []:
+                drawPath()
+                newPath()
+
 
 
 size(W, W)
@@ -51,7 +67,7 @@ for i in range(FRAMES):
     if i == 0:
         sorter = f.sorter
     start_page()
-    draw_dlists(f.dlists())
+    draw_packed_dlists(f.packed_dlists())
     fill(1, 0, 0, 1)
     stroke(None)
     for line in f.lines:
@@ -6,36 +6,29 @@ SVG Frame Animator - Combine multiple SVG files into one animated SVG
 import os
 import re
 import argparse
-from pathlib import Path
-from xml.etree import ElementTree as ET
+import sys
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from svgwriter import AnimatedSvg
 
-def extract_svg_content(svg_file):
-    """Extract the inner content of an SVG file, removing the outer <svg> tag."""
-    try:
-        tree = ET.parse(svg_file)
-        root = tree.getroot()
-
-        # Get dimensions from the first SVG for the final output
-        width = root.get("width", "100")
-        height = root.get("height", "100")
-        viewbox = root.get("viewBox", f"0 0 {width} {height}")
-
-        # Convert the root element's children to string
-        content = ""
-        for child in root:
-            content += ET.tostring(child, encoding="unicode")
 
-        return content, width, height, viewbox
-    except ET.ParseError as e:
-        print(f"Error parsing {svg_file}: {e}")
-        return None, None, None, None
+def svg_size(svg_text):
+    """The width and height of an SVG document, from its outer <svg> tag."""
+    tag = svg_text[svg_text.index("<svg") : svg_text.index(">", svg_text.index("<svg"))]
+    sizes = []
+    for name in ["width", "height"]:
+        match = re.search(rf"""\b{name}=["']([\d.]+)""", tag)
+        sizes.append(float(match[1]) if match else 100)
+    return tuple(round(s) for s in sizes)
 
 
 def create_animated_svg(svg_files, output_file, duration=0.1, iterations="infinite"):
     """
     Create an animated SVG from multiple frame files.
 
+    The frames are copied into the output one at a time, so only one frame
+    is in memory, and the output grows linearly with the number of frames.
+
     Args:
         svg_files: List of SVG file paths in frame order
         output_file: Output animated SVG file path
@@ -47,84 +40,25 @@ def create_animated_svg(svg_files, output_file, duration=0.1, iterations="infini
         print("No SVG files provided")
         return False
 
-    frames = []
-    width, height, viewbox = None, None, None
-
-    # Extract content from each SVG file
-    for i, svg_file in enumerate(svg_files):
-        content, w, h, vb = extract_svg_content(svg_file)
-        if content is None:
-            continue
-
-        # Use dimensions from first valid file
-        if width is None:
-            width, height, viewbox = w, h, vb
-
-        frames.append({"id": f"frame{i}", "content": content})
-
-    if not frames:
-        print("No valid SVG files found")
-        return False
-
-    # Calculate animation timing
-    total_duration = len(frames) * duration
-    frame_percentage = 100 / len(frames)
-
-    # Generate CSS animation
-    css_keyframes = "@keyframes svgAnimation {\n"
-
-    for i, frame in enumerate(frames):
-        start_pct = i * frame_percentage
-        end_pct = start_pct + frame_percentage
-
-        if i < len(frames) - 1:
-            css_keyframes += f"  {start_pct:.1f}%, {end_pct:.1f}% {{ opacity: {'1' if i == 0 else '0'}; }}\n"
-        else:  # Last frame
-            css_keyframes += f"  {start_pct:.1f}%, 100% {{ opacity: 0; }}\n"
-
-    css_keyframes += "}\n\n"
-
-    # Create frame-specific animations
-    frame_animations = ""
-    for i, frame in enumerate(frames):
-        visibility_keyframes = f"@keyframes showFrame{i} {{\n"
-
-        for j in range(len(frames)):
-            pct = j * frame_percentage
-            opacity = "1" if j == i else "0"
-            visibility_keyframes += f"  {pct:.1f}% {{ opacity: {opacity}; }}\n"
-
-        visibility_keyframes += "}\n\n"
-        frame_animations += visibility_keyframes
-
-    # Generate the final SVG
-    svg_content = f'''<?xml version="1.0" encoding="UTF-8"?>
-<svg width="{width}" height="{height}" viewBox="{viewbox}" 
-     xmlns="http://www.w3.org/2000/svg">
-<defs>
-  <style type="text/css"><![CDATA[
-{frame_animations}
-  ]]></style>
-</defs>
-'''
-
-    # Add each frame as a group
-    for i, frame in enumerate(frames):
-        animation_style = (
-            f"animation: showFrame{i} {total_duration}s {iterations} steps(1, end);"
-        )
-        svg_content += (
-            f'  <g id="{frame["id"]}" style="opacity:0; {animation_style}">\n'
-        )
-        svg_content += f"    {frame['content']}\n"
-        svg_content += "  </g>\n"
-
-    svg_content += "</svg>"
-
-    # Write to output file
     try:
-        with open(output_file, "w", encoding="utf-8") as f:
-            f.write(svg_content)
+        anim = None
+        for svg_file in svg_files:
+            with open(svg_file, encoding="utf-8") as f:
+                svg_text = f.read()
+            if "<svg" not in svg_text:
+                print(f"Error parsing {svg_file}: no <svg> element")
+                continue
+            if anim is None:
+                # Use dimensions from first valid file
+                width, height = svg_size(svg_text)
+                anim = AnimatedSvg(
+                    width, height, output=output_file, frame_time=duration, iterations=iterations
+                )
+            anim.add_svg(svg_text)
+        if anim is None:
+            print("No valid SVG files found")
+            return False
+        anim.close()
         print(f"Animated SVG created: {output_file}")
         return True
     except IOError as e:
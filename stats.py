@@ -0,0 +1,112 @@
+"""Opt-in timing, counts and memory peaks for the stages of a render."""
+
+import contextlib
+import dataclasses
+import time
+import tracemalloc
+from collections import Counter
+
+
+@dataclasses.dataclass
+class StageStats:
+    seconds: float = 0.0
+    calls: int = 0
+    peak_bytes: int = 0
+
+
+class Stats:
+    """
+    Collects per-stage statistics.
+
+    Pass one to `Fluidity(stats=...)`, `cairo_context(stats=...)` or
+    `Animation(stats=...)`; the same object can be shared by all of them to
+    total up a whole job.
+
+    Arguments:
+        memory (bool): also record the peak Python allocation in each stage
+            with tracemalloc.  This slows everything down noticeably.
+    """
+
+    def __init__(self, *, memory=False):
+        self.memory = memory
+        self.stages = {}
+        self.counts = Counter()
+        self.rates = {}
+        # The peak traced memory of each running stage, innermost last.
+        self._peaks = []
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Time the code in the `with` block as stage `name`."""
+        stage = self.stages.setdefault(name, StageStats())
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            # tracemalloc has one peak, reset here for this stage.  Save the
+            # enclosing stages' peak so far first.
+            self._save_peak()
+            self._peaks.append(0)
+            tracemalloc.reset_peak()
+            start_bytes = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+            if self.memory:
+                self._save_peak()
+                peak = self._peaks.pop()
+                stage.peak_bytes = max(stage.peak_bytes, peak - start_bytes)
+                # The enclosing stage's peak includes this one's.
+                if self._peaks:
+                    self._peaks[-1] = max(self._peaks[-1], peak)
+
+    def _save_peak(self):
+        """Fold tracemalloc's peak into the innermost running stage's."""
+        if self._peaks:
+            self._peaks[-1] = max(self._peaks[-1], tracemalloc.get_traced_memory()[1])
+
+    def record(self, name, seconds):
+        """Add one call taking `seconds` to stage `name`."""
+        stage = self.stages.setdefault(name, StageStats())
+        stage.seconds += seconds
+        stage.calls += 1
+
+    def count(self, name, n=1):
+        """Add `n` to the counter `name`."""
+        self.counts[name] += n
+
+    def as_dict(self):
+        """The statistics as plain data, for exporting as JSON."""
+        return {
+            "stages": {name: dataclasses.asdict(stage) for name, stage in self.stages.items()},
+            "counts": dict(self.counts),
+            "rates": dict(self.rates),
+        }
+
+    def report(self):
+        """A readable table of the statistics."""
+        lines = []
+        for name, stage in self.stages.items():
+            line = f"{name:12} {stage.seconds * 1000:10.2f} ms  {stage.calls:8} calls"
+            if self.memory:
+                line += f"  {stage.peak_bytes / 1e6:10.2f} MB peak"
+            lines.append(line)
+        for name, n in self.counts.items():
+            lines.append(f"{name:20} {n:12}")
+        for name, rate in self.rates.items():
+            lines.append(f"{name:20} {rate:12.2f}")
+        return "\n".join(lines)
+
+
+def stage(stats, name):
+    """`stats.stage(name)`, or a do-nothing context manager if stats is None."""
+    if stats is None:
+        return contextlib.nullcontext()
+    return stats.stage(name)
+
+
+def count(stats, name, n=1):
+    """`stats.count(name, n)`, unless stats is None."""
+    if stats is not None:
+        stats.count(name, n)
@@ -0,0 +1,254 @@
+"""Write SVG directly, without cairo, for drawings that are just paths."""
+
+import contextlib
+import hashlib
+import io
+import os.path
+import re
+
+import numpy as np
+
+
+def svg_color(kind, color):
+    """SVG attributes for a cairo-style (r, g, b[, a]) `color`, as fill or stroke."""
+    r, g, b, *a = color
+    attrs = f'{kind}="rgb({round(r * 255)},{round(g * 255)},{round(b * 255)})"'
+    if a and a[0] < 1:
+        attrs += f' {kind}-opacity="{a[0]:g}"'
+    return attrs
+
+
+class SvgDrawing:
+    """
+    An SVG document written element by element.
+
+    Arguments:
+        width (int), height (int): the size of the drawing in pixels.
+        output: a file name, a text stream to write to (a file, or a socket's
+            makefile("w")), or None to keep the SVG in memory for display
+            in Jupyter.
+        precision (int): the number of decimal places in coordinates.
+
+    Use it as a context manager, or call close(), to finish the document.
+    """
+
+    def __init__(self, width, height, output=None, precision=2):
+        self.width = width
+        self.height = height
+        self.precision = precision
+        self.fmt = f"%.{precision}f"
+        self.output = output
+        self._close_out = False
+        if output is None:
+            self.out = io.StringIO()
+        elif isinstance(output, str):
+            self.output = os.path.expandvars(os.path.expanduser(output))
+            self.out = open(self.output, "w", encoding="utf-8")
+            self._close_out = True
+        else:
+            self.out = output
+        self.out.write(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+            f'width="{width}" height="{height}" '
+            f'viewBox="0 0 {width} {height}">\n'
+        )
+
+    def size(self):
+        return (self.width, self.height)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, typ, val, tb):
+        self.close()
+
+    def close(self):
+        """Finish the document."""
+        self.out.write("</svg>\n")
+        if self._close_out:
+            self.out.close()
+
+    def _repr_svg_(self):
+        if self.output is None:
+            return self.out.getvalue()
+
+    def _repr_html_(self):
+        if self.output is not None:
+            return f"<b><i>Wrote to {self.output}</i></b>"
+
+    def begin_group(self, attrs):
+        self.out.write(f"<g {attrs}>\n")
+
+    def end_group(self):
+        self.out.write("</g>\n")
+
+    def rect(self, x, y, width, height, attrs=""):
+        f = self.fmt
+        self.out.write(
+            f'<rect x="{f % x}" y="{f % y}" width="{f % width}" height="{f % height}" {attrs}/>\n'
+        )
+
+    def paths(self, ds):
+        """Write a <path> for each d string in `ds`."""
+        self.out.writelines(f'<path d="{d}"/>\n' for d in ds)
+
+    def keyed_paths(self, keys, make_ds):
+        """Write the paths `make_ds(indices)` for all of `keys`.  See AnimatedSvg."""
+        self.paths(make_ds(range(len(keys))))
+
+    def circles(self, cxs, cys, r):
+        """Write a <circle> for each center in `cxs`, `cys`."""
+        f = self.fmt
+        template = f'<circle cx="{f}" cy="{f}" r="{f % r}"/>\n'
+        coords = np.stack([cxs, cys], axis=-1).tolist()
+        self.out.writelines(template % tuple(c) for c in coords)
+
+    def curve_ds(self, ctrl_points):
+        """
+        d strings for closed curves, from an (nlines, npoints, 4, 2) array.
+
+        Each line's coordinates are formatted with a single % operation.
+        """
+        nlines, npoints = ctrl_points.shape[:2]
+        f = self.fmt
+        template = f"M{f} {f}" + f"C{f} {f} {f} {f} {f} {f}" * npoints + "Z"
+        coords = np.concatenate(
+            [ctrl_points[:, 0, 0, :], ctrl_points[:, :, 1:, :].reshape(nlines, -1)],
+            axis=1,
+        )
+        return [template % tuple(line) for line in coords.tolist()]
+
+    def polyline_ds(self, points, *, closed):
+        """d strings for lines through the points of an (nlines, npoints, 2) array."""
+        nlines, npoints = points.shape[:2]
+        f = self.fmt
+        template = f"M{f} {f}" + f"L{f} {f}" * (npoints - 1) + ("Z" if closed else "")
+        return [template % tuple(line) for line in points.reshape(nlines, -1).tolist()]
+
+
+class AnimatedSvg(SvgDrawing):
+    """
+    An animated SVG, written a frame at a time.
+
+    Each frame is a group that's visible for `frame_time` seconds.  All the
+    frames share one CSS animation and differ only in their delay, so the
+    file grows linearly with the number of frames.  The style sheet comes
+    last, when the number of frames is known, so frames stream straight to
+    the output.
+
+    Draw a frame with the SvgDrawing methods inside `with anim.frame():`
+    (for example with `Fluidity.draw_svg(anim)`), or add a whole SVG document,
+    such as a finished `cairo_context(format="svg")`, with `add_svg`.
+
+    Frames of an animation mostly repeat the previous frame's curves.  With
+    `dedup`, each distinct path is written once, in a <defs> where it first
+    appears, and every frame that draws it again has just a <use>.
+
+    Arguments:
+        width, height, output, precision: as for SvgDrawing.
+        frame_time (float): seconds per frame.
+        iterations: how many times to play, or "infinite".
+        dedup (bool): write repeated paths once.
+    """
+
+    def __init__(
+        self, width, height, output=None, precision=2, frame_time=0.1, iterations="infinite", dedup=True
+    ):
+        super().__init__(width, height, output=output, precision=precision)
+        self.frame_time = frame_time
+        self.iterations = iterations
+        self.nframes = 0
+        self.dedup = dedup
+        # A digest of each path's d string, or a key from keyed_paths: its
+        # id.  Neither holds on to the path text, so memory stays small even
+        # when every frame's paths are new.
+        self._path_ids = {}
+
+    @contextlib.contextmanager
+    def frame(self):
+        """Put everything drawn in the `with` block into the next frame."""
+        self.out.write(f'<g class="frame" style="animation-delay:{self.nframes * self.frame_time:g}s">\n')
+        yield self
+        self.out.write("</g>\n")
+        self.nframes += 1
+
+    def paths(self, ds):
+        """Write each d string in `ds`, as a <use> if it's been written before."""
+        if not self.dedup:
+            super().paths(ds)
+            return
+        path_ids = self._path_ids
+        new_pids = []
+        new_ds = []
+        pids = []
+        for d in ds:
+            digest = hashlib.blake2b(d.encode(), digest_size=16).digest()
+            pid = path_ids.get(digest)
+            if pid is None:
+                pid = path_ids[digest] = f"p{len(path_ids)}"
+                new_pids.append(pid)
+                new_ds.append(d)
+            pids.append(pid)
+        self._write_paths(new_pids, new_ds, pids)
+
+    def keyed_paths(self, keys, make_ds):
+        """
+        Write a path for each of `keys`, as a <use> if it's been written before.
+
+        Paths with equal keys must be equal.  `make_ds(indices)` returns the d
+        strings for the keys at `indices`, and is called only for keys not
+        seen before, so repeated paths aren't even formatted.
+        """
+        if not self.dedup:
+            super().keyed_paths(keys, make_ds)
+            return
+        path_ids = self._path_ids
+        new = []
+        pids = []
+        for n, key in enumerate(keys):
+            pid = path_ids.get(key)
+            if pid is None:
+                pid = path_ids[key] = f"p{len(path_ids)}"
+                new.append(n)
+            pids.append(pid)
+        self._write_paths([pids[n] for n in new], make_ds(new) if new else [], pids)
+
+    def _write_paths(self, new_pids, new_ds, pids):
+        """Define the new paths, then <use> all of `pids`."""
+        if new_pids:
+            # A <use> takes its style from where it is, not from the <defs>.
+            self.out.write("<defs>\n")
+            self.out.writelines(f'<path id="{pid}" d="{d}"/>\n' for pid, d in zip(new_pids, new_ds))
+            self.out.write("</defs>\n")
+        # xlink:href, not SVG 2's href, for renderers that only know SVG 1.1.
+        self.out.writelines(f'<use xlink:href="#{pid}"/>\n' for pid in pids)
+
+    def add_svg(self, svg):
+        """Add an SVG document (text, or a cairo SVG context) as the next frame."""
+        if not isinstance(svg, str):
+            svg = svg._svg_text()
+        start = svg.index(">", svg.index("<svg")) + 1
+        end = svg.rindex("</svg>")
+        # Documents drawn separately reuse the same ids: make them unique.
+        prefix = f"f{self.nframes}-"
+        content = _SVG_ID_RE.sub(lambda m: m[1] + prefix, svg[start:end])
+        with self.frame():
+            self.out.write(content)
+            self.out.write("\n")
+
+    def close(self):
+        if self.nframes > 1:
+            visible = 100 / self.nframes
+            self.out.write(
+                "<style>\n"
+                ".frame{visibility:hidden;"
+                f"animation:show {self.nframes * self.frame_time:g}s step-end {self.iterations}}}\n"
+                f"@keyframes show{{0%{{visibility:visible}}{visible:.6g}%,100%{{visibility:hidden}}}}\n"
+                "</style>\n"
+            )
+        super().close()
+
+
+# The start of an id, or of a reference to one, in SVG text.
+_SVG_ID_RE = re.compile(r"""(\bid=["']|url\(#|href=["']#)""")
@@ -0,0 +1,17 @@
+"""closed_cubic_curves must match cubic_bezier_spline, one curve at a time."""
+
+import numpy as np
+import pytest
+from cubic_bezier_spline import new_closed_interpolating_spline
+
+from cubic_spline import closed_cubic_curves
+
+
+@pytest.mark.parametrize("npoints", [2, 3, 4, 10, 25])
+def test_closed_cubic_curves_match_spline(npoints):
+    lines = np.random.default_rng(npoints).uniform(-1, 1, size=(5, npoints, 2))
+    curves = closed_cubic_curves(lines)
+    assert curves.shape == (5, npoints, 4, 2)
+    for line, curve in zip(lines, curves):
+        expected = np.asarray(new_closed_interpolating_spline(line).cpts)
+        np.testing.assert_allclose(curve, expected, rtol=0, atol=1e-12)
@@ -0,0 +1,31 @@
+"""Batched computations must match their one-at-a-time references."""
+
+import numpy as np
+import pytest
+from hilbertcurve.hilbertcurve import HilbertCurve
+
+from fluidity import CircularNoise, LinearNoise, hilbert_keys
+
+
+@pytest.mark.parametrize("bits", [1, 2, 6, 10])
+def test_hilbert_keys_match_hilbertcurve(bits):
+    coords = np.random.default_rng(bits).integers(0, 2**bits, size=(500, 2))
+    expected = HilbertCurve(bits, 2).distances_from_points(coords.tolist())
+    assert hilbert_keys(coords, bits).tolist() == expected
+
+
+@pytest.mark.parametrize(
+    "noise",
+    [
+        LinearNoise(seed=1),
+        LinearNoise(seed=7, istart=0.3, istep=0.05),
+        CircularNoise(seed=5, isteps=30),
+        CircularNoise(seed=5, isteps=30, istart=0.5),
+        CircularNoise(seed=2, isteps=7, istart=3),
+    ],
+)
+def test_noise_points_match_point(noise):
+    i_indices = range(40)
+    j_indices = range(6)
+    expected = [[noise.point(i, j) for j in j_indices] for i in i_indices]
+    assert noise.points(i_indices, j_indices).tolist() == np.array(expected).tolist()
@@ -0,0 +1,23 @@
+"""cyclic_hobby_curves must match HobbyCurve, one curve at a time."""
+
+import numpy as np
+import pytest
+
+from hobby import HobbyCurve, cyclic_hobby_curves
+
+
+def hobby_reference(points):
+    ctrls = HobbyCurve(points, cyclic=True).get_ctrl_points()
+    n = len(points)
+    return np.array(
+        [(points[i], ctrls[2 * i], ctrls[2 * i + 1], points[(i + 1) % n]) for i in range(n)]
+    )
+
+
+@pytest.mark.parametrize("npoints", [3, 4, 10, 25])
+def test_cyclic_hobby_curves_match_hobby_curve(npoints):
+    lines = np.random.default_rng(npoints).uniform(-1, 1, size=(5, npoints, 2))
+    curves = cyclic_hobby_curves(lines)
+    assert curves.shape == (5, npoints, 4, 2)
+    for line, curve in zip(lines, curves):
+        np.testing.assert_allclose(curve, hobby_reference(line), rtol=0, atol=1e-12)